@@ -316,17 +316,161 @@
 #     main()
 
 
+import os
+import logging
+import threading
 import streamlit as st
 from mint import (
-    download_papers,
-    extract_captions,
-    extract_equations,
-    filter_images,
+    corpus_store,
     generate_metadata,
-    latex_template,
     pandoc_utils,
+    profiling,
+    progress,
     requirements_check,
 )
+from mint.metadata_pool import MetadataPool
+from mint.pipeline import STAGE_NAMES, corpus_stages
+from mint.stages import run_stages
+
+logging.basicConfig(level=logging.INFO)
+
+
+class CorpusJob:
+    def __init__(self, temp_dir, params, max_workers, force):
+        self.temp_dir = temp_dir
+        self.params = params
+        self.max_workers = max_workers
+        self.force = force
+        # The stages report from their own threads; the sidebar polls the
+        # latest event of each, and every event is also logged for later
+        self.events = progress.LatestEvents()
+        on_progress = progress.combine(
+            self.events,
+            progress.json_lines_sink(os.path.join(temp_dir, "progress.jsonl")),
+        )
+        self.stages = corpus_stages(temp_dir, *params, on_progress=on_progress)
+        self.statuses = {}
+        self.error = None
+        self.cancel = threading.Event()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def update(self, name, status):
+        self.statuses[name] = status
+
+    def run(self):
+        try:
+            requirements_check.check_requirements()
+            run_stages(
+                self.temp_dir,
+                self.stages,
+                max_workers=self.max_workers,
+                force=self.force,
+                callback=self.update,
+                cancel=self.cancel,
+            )
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+    @property
+    def cancelled(self):
+        return "cancelled" in self.statuses.values()
+
+    @property
+    def fraction(self):
+        finished = [s for s in self.statuses.values() if s != "running"]
+        return len(finished) / len(self.stages) if self.stages else 1.0
+
+    @property
+    def current(self):
+        running = [name for name, s in self.statuses.items() if s == "running"]
+        if running:
+            if self.cancel.is_set():
+                return f"Cancelling, waiting for {', '.join(running)}"
+            return f"Running {', '.join(running)}"
+        if self.error is not None:
+            return "Corpus build failed"
+        if self.cancelled:
+            return "Corpus build cancelled"
+        return "Corpus ready" if self.done.is_set() else "Queued"
+
+
+class CorpusJobs:
+    # At most one job per temp dir, since jobs write the same corpus files
+    # and stage state. Shared by every session through st.cache_resource.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.jobs = {}
+
+    def get(self, temp_dir):
+        with self.lock:
+            return self.jobs.get(temp_dir)
+
+    def start(self, temp_dir, params, max_workers, force):
+        # Returns None while another job is still running in temp_dir
+        with self.lock:
+            job = self.jobs.get(temp_dir)
+            if job is not None and not job.done.is_set():
+                return None
+            os.makedirs(temp_dir, exist_ok=True)
+            job = self.jobs[temp_dir] = CorpusJob(
+                temp_dir, params, max_workers, force
+            )
+            return job
+
+
+@st.cache_resource(show_spinner=False)
+def corpus_jobs():
+    return CorpusJobs()
+
+
+# Pre-generates metadata in the background so each paper gets a fresh record
+# without waiting on the chat completions API
+@st.cache_resource(show_spinner=False)
+def metadata_pool(temp_dir, chatgpt_token, chatgpt_topic, size):
+    pool = MetadataPool(
+        os.path.join(temp_dir, "metadata_pool"), chatgpt_token, chatgpt_topic, size
+    )
+    pool.refill_async()
+    return pool
+
+
+@st.fragment(run_every=1)
+def show_corpus_progress(job):
+    # Fragments can't write to st.sidebar themselves; the caller opens it
+    if job.done.is_set() and job.error is None:
+        if job.cancelled:
+            st.warning(job.current)
+        else:
+            st.success(job.current)
+        return
+    if job.error is not None:
+        st.error(f"{job.current}: {job.error}")
+        return
+    st.progress(job.fraction, text=job.current)
+    for event in job.events.snapshot().values():
+        if event["finished"]:
+            continue
+        fraction = min(1.0, event["done"] / event["total"]) if event["total"] else 0.0
+        st.progress(fraction, text=progress.format_event(event))
+
+
+def streamlit_sink(placeholder):
+    # Streamlit elements can only be updated from the script thread, so
+    # events from worker threads are dropped; the final one always arrives
+    # from the thread that opened the tracker
+    script_thread = threading.current_thread()
+
+    def on_progress(event):
+        if threading.current_thread() is not script_thread:
+            return
+        fraction = min(1.0, event["done"] / event["total"]) if event["total"] else 0.0
+        placeholder.progress(fraction, text=progress.format_event(event))
+
+    return on_progress
 
 
 def main():
@@ -335,7 +479,9 @@ def main():
     # Sidebar options
     st.sidebar.header("Options")
     temp_dir = st.sidebar.text_input("Temporary Directory", "/tmp/paperify")
-    arxiv_category = st.sidebar.text_input("arXiv Category", "math")
+    arxiv_category = st.sidebar.text_input(
+        "arXiv Category", "math", help="Comma-separated categories or queries"
+    )
     num_papers = st.sidebar.number_input("Number of Papers", value=100)
     max_concurrency = st.sidebar.number_input("Max Concurrency", value=32)
     figure_prob = st.sidebar.number_input("Figure Frequency", value=25)
@@ -346,11 +492,89 @@ def main():
     min_caption_length = st.sidebar.number_input("Min Caption Length", value=20)
     chatgpt_token = st.sidebar.text_input("ChatGPT Token")
     chatgpt_topic = st.sidebar.text_input("ChatGPT Topic", "cybersecurity")
+    metadata_pool_size = st.sidebar.number_input("Metadata Pool Size", value=10)
+    metadata_timeout = st.sidebar.number_input("Metadata Timeout (s)", value=30)
+    shards = st.sidebar.number_input(
+        "Build Shards", value=1, min_value=1, help="Compile sections in parallel"
+    )
+    corpus_budget = st.sidebar.number_input(
+        "Corpus Budget (GB)",
+        value=0.0,
+        min_value=0.0,
+        help="Evict least recently used corpus files above this; 0 is unlimited",
+    )
+    optimize = st.sidebar.checkbox(
+        "Optimize PDF", help="Deduplicate images, recompress and linearize"
+    )
+    topical = st.sidebar.checkbox(
+        "Match Snippets to Text",
+        value=True,
+        help="Insert figures and equations similar to the surrounding text",
+    )
+    block_aware = st.sidebar.checkbox(
+        "Block-Aware Insertion",
+        value=True,
+        help="Only insert between paragraphs, never inside lists, tables or code",
+    )
     quiet = st.sidebar.checkbox("Quiet Mode")
-    skip_downloading = st.sidebar.checkbox("Skip Downloading")
-    skip_extracting = st.sidebar.checkbox("Skip Extracting")
-    skip_metadata = st.sidebar.checkbox("Skip Metadata")
-    skip_filtering = st.sidebar.checkbox("Skip Filtering")
+    stream = st.sidebar.checkbox(
+        "Streaming Pipeline", help="Filter and extract papers while downloading"
+    )
+    compress = st.sidebar.checkbox(
+        "Compress Corpus", help="Keep TeX sources and snippets gzipped on disk"
+    )
+    force = st.sidebar.multiselect("Force Rebuild", STAGE_NAMES)
+    profile = st.sidebar.checkbox("Profile Stages")
+    if profile and profiling.report() is None:
+        profiling.enable(os.path.join(temp_dir, "profiles"))
+    elif not profile:
+        profiling.disable()
+
+    # Every parameter that affects the corpus. The corpus is only built once
+    # asked for, in the background while the user picks a document; a
+    # rebuild skips every stage that is still up to date.
+    params = (
+        arxiv_category,
+        num_papers,
+        max_concurrency,
+        max_size,
+        min_caption_length,
+        min_equation_length,
+        max_equation_length,
+        quiet,
+        stream,
+        compress,
+    )
+    jobs = corpus_jobs()
+    job = jobs.get(temp_dir)
+    pool = None
+    if chatgpt_token and metadata_pool_size > 0:
+        pool = metadata_pool(temp_dir, chatgpt_token, chatgpt_topic, metadata_pool_size)
+
+    # Fetch the next paper's metadata while the corpus builds and the user
+    # picks a document; it is only joined right before the build
+    metadata_key = (chatgpt_token, chatgpt_topic)
+    if st.session_state.get("metadata_key") != metadata_key:
+        st.session_state.metadata_key = metadata_key
+        st.session_state.metadata = generate_metadata.start_metadata(
+            chatgpt_token, chatgpt_topic, pool, metadata_timeout
+        )
+    st.sidebar.header("Corpus")
+    if job is not None:
+        with st.sidebar:
+            show_corpus_progress(job)
+    if job is not None and not job.done.is_set():
+        if job.params != params:
+            st.sidebar.info("Settings changed; rebuild once this build finishes")
+        if st.sidebar.button("Cancel Corpus Build", disabled=job.cancel.is_set()):
+            job.cancel.set()
+            st.rerun()
+    elif st.sidebar.button("Build Corpus" if job is None else "Rebuild Corpus"):
+        jobs.start(temp_dir, params, max_concurrency, tuple(force))
+        st.rerun()
+    if profile:
+        with st.sidebar.expander("Profiling Report"):
+            st.json(profiling.report())
 
     # Main content
     st.header("Upload Document or Enter URL")
@@ -377,45 +601,60 @@ def main():
             st.error("Please enter a URL.")
             return
 
-        # Check requirements
-        requirements_check.check_requirements()
-
-         # Dump LaTeX template
-        latex_template.dump_latex_template(temp_dir)
-
-        # Download papers
-        if not skip_downloading:
-            download_papers.download_papers(
-                temp_dir, arxiv_category, num_papers, max_concurrency
-            )
+        # Wait for the corpus, which is usually already built. A corpus built
+        # with other settings, or not at all, is brought up to date first.
+        if job is not None and not job.done.is_set():
+            with st.spinner("Waiting for the corpus to finish building..."):
+                job.done.wait()
+        if job is None or job.params != params or job.cancelled:
+            job = jobs.start(temp_dir, params, max_concurrency, tuple(force))
+            if job is None:
+                st.error("Another corpus build is running in this directory.")
+                return
+            with st.spinner("Building the corpus..."):
+                job.done.wait()
+        if job.error is not None:
+            st.error(f"Corpus build failed: {job.error}")
+            return
+        if job.cancelled:
+            st.error("Corpus build was cancelled.")
+            return
 
-        # Filter images
-        if not skip_filtering:
-            filter_images.filter_large_files(temp_dir, max_size)
-            filter_images.filter_diagrams(temp_dir)
+        # Join the metadata started earlier, and start the next paper's
+        generate_metadata.finish_metadata(
+            temp_dir, st.session_state.metadata, metadata_timeout
+        )
+        st.session_state.metadata = generate_metadata.start_metadata(
+            chatgpt_token, chatgpt_topic, pool, metadata_timeout
+        )
 
-        # Extract captions and equations
-        if not skip_extracting:
-            extract_captions.extract_captions(
-                temp_dir, min_caption_length, max_concurrency, quiet
-            )
-            extract_equations.extract_equations(
+        # Build paper
+        output_file = f"{temp_dir}/output.pdf"
+        build_progress = st.empty()
+        with profiling.stage("build_paper"):
+            report = pandoc_utils.build_paper(
+                input_file,
+                output_file,
                 temp_dir,
-                min_equation_length,
-                max_equation_length,
-                max_concurrency,
+                figure_prob,
+                equation_prob,
                 quiet,
+                shards=shards,
+                postprocess=optimize,
+                on_progress=streamlit_sink(build_progress),
+                topical=topical,
+                block_aware=block_aware,
             )
-
-        # Generate metadata
-        if not skip_metadata:
-            generate_metadata.generate_metadata(temp_dir, chatgpt_token, chatgpt_topic)
-
-        # Build paper
-        output_file = f"{temp_dir}/output.pdf"
-        pandoc_utils.build_paper(
-            input_file, output_file, temp_dir, figure_prob, equation_prob, quiet
-        )
+        build_progress.empty()
+        if report:
+            st.caption(
+                f"PDF size {report['size_before'] / 1e6:.1f} MB -> "
+                f"{report['size_after'] / 1e6:.1f} MB"
+            )
+        if profile:
+            profiling.write_report(os.path.join(temp_dir, "profile.json"))
+        if corpus_budget:
+            corpus_store.enforce_budget(temp_dir, int(corpus_budget * 1e9))
 
         # Display the generated paper
         with open(output_file, "rb") as f:
@@ -0,0 +1,62 @@
+import json
+import time
+import random
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Serves chat-completions replies with canned metadata, so metadata generation
+# can be exercised offline:
+#   python -m benchmarks.chat_stub --port 8765
+#   PAPERMINT_CHAT_API_URL=http://127.0.0.1:8765/v1/chat/completions ...
+
+
+def fake_metadata(rng):
+    n = rng.randrange(1000)
+    return {
+        "journal_name": "Journal of Synthetic Results",
+        "thanks": "The authors thank the benchmark harness.",
+        "author_name": f"Author {n}",
+        "author_organization": "Institute of Stand-in Servers",
+        "author_email": f"author{n}@example.org",
+        "paper_title": f"On the Generation of Paper {n}",
+        "paper_abstract": "We study the latency of metadata generation.",
+    }
+
+
+def make_handler(latency, invalid_rate, rng):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            if rng.random() < invalid_rate:
+                content = "Sure! Here is your JSON:"
+            else:
+                content = json.dumps(fake_metadata(rng))
+            body = json.dumps(
+                {"choices": [{"message": {"role": "assistant", "content": content}}]}
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = ArgumentParser(description="Stand-in chat completions server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--invalid-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    handler = make_handler(args.latency, args.invalid_rate, random.Random(args.seed))
+    ThreadingHTTPServer(("127.0.0.1", args.port), handler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import os
+import io
+import gc
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser
+from benchmarks.synthetic_corpus import generate_corpus
+from mint import (
+    compressed_io,
+    corpus_fs,
+    download_papers,
+    extract_captions,
+    extract_equations,
+    filter_images,
+    generate_metadata,
+    latex_template,
+    pandoc_utils,
+)
+
+MAX_SIZE = 2500000
+LATEX_STAGES = ["extract_captions", "extract_equations", "check_latex", "build_paper"]
+
+
+def have_latex_tools():
+    return bool(shutil.which("pandoc") and shutil.which("pdflatex"))
+
+
+def measure(func, items=0, nbytes=0):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": elapsed,
+        "items": items,
+        "items_per_s": items / elapsed if elapsed else None,
+        "bytes": nbytes,
+        "mb_per_s": nbytes / elapsed / 1e6 if elapsed and nbytes else None,
+        "peak_python_bytes": peak,
+    }
+
+
+def listdir(temp_dir, name):
+    return list(corpus_fs.iter_paths(os.path.join(temp_dir, name)))
+
+
+def synthetic_document(path, paragraphs):
+    with open(path, "w") as f:
+        for i in range(paragraphs):
+            if i % 10 == 0:
+                f.write(f"# Section {i // 10 + 1}\n\n")
+            f.write(f"Paragraph {i} of the synthetic benchmark document.\n\n")
+
+
+def bench_scale(work_dir, num_papers, seed, args):
+    corpus_dir = os.path.join(work_dir, "corpus")
+    temp_dir = os.path.join(work_dir, "temp")
+    archives = generate_corpus(
+        corpus_dir,
+        num_papers,
+        num_captions=args.captions,
+        num_equations=args.equations,
+        num_images=args.images,
+        seed=seed,
+    )
+    for d in ("images", "tex", "unknown_files"):
+        os.makedirs(os.path.join(temp_dir, d), exist_ok=True)
+    latex_template.dump_latex_template(temp_dir)
+    results = {}
+
+    def extract():
+        for path in archives:
+            with open(path, "rb") as f:
+                download_papers.extract_eprint(
+                    temp_dir, io.BytesIO(f.read()), compress=args.compress
+                )
+
+    results["extract_eprint"] = measure(
+        extract, len(archives), sum(os.path.getsize(p) for p in archives)
+    )
+
+    images = listdir(temp_dir, "images")
+    results["filter_large_files"] = measure(
+        lambda: filter_images.filter_large_files(temp_dir, MAX_SIZE),
+        len(images),
+        sum(os.path.getsize(p) for p in images),
+    )
+    results["filter_diagrams"] = measure(
+        lambda: filter_images.filter_diagrams(temp_dir),
+        len(listdir(temp_dir, "images")),
+    )
+
+    tex_files = listdir(temp_dir, "tex")
+    tex_bytes = sum(os.path.getsize(p) for p in tex_files)
+
+    def scan(find):
+        def run():
+            for path in tex_files:
+                with compressed_io.open_text(path) as f:
+                    find(f.read())
+
+        return run
+
+    results["find_captions"] = measure(
+        scan(extract_captions.find_captions), len(tex_files), tex_bytes
+    )
+    results["find_equations"] = measure(
+        scan(extract_equations.find_equations), len(tex_files), tex_bytes
+    )
+
+    if not have_latex_tools():
+        for stage in LATEX_STAGES:
+            results[stage] = {"skipped": "pandoc and pdflatex are not on the PATH"}
+        return results
+
+    results["extract_captions"] = measure(
+        lambda: extract_captions.extract_captions(
+            temp_dir, 20, args.concurrency, True
+        ),
+        len(tex_files),
+        tex_bytes,
+    )
+    results["extract_equations"] = measure(
+        lambda: extract_equations.extract_equations(
+            temp_dir, 5, 120, args.concurrency, True
+        ),
+        len(tex_files),
+        tex_bytes,
+    )
+
+    with compressed_io.open_text(os.path.join(temp_dir, "equations.txt")) as f:
+        snippets = [f"$${eq}$$" for eq in f]
+    snippets = snippets[: args.check_latex_samples]
+    results["check_latex"] = measure(
+        lambda: [pandoc_utils.check_latex(s, temp_dir) for s in snippets],
+        len(snippets),
+    )
+
+    generate_metadata.generate_metadata(temp_dir, None, None)
+    document = os.path.join(work_dir, "document.md")
+    synthetic_document(document, num_papers * 10)
+    results["build_paper"] = measure(
+        lambda: pandoc_utils.build_paper(
+            document, os.path.join(work_dir, "paper.pdf"), temp_dir, 25, 25, True
+        ),
+        num_papers * 10,
+        os.path.getsize(document),
+    )
+    return results
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark mint stages on a synthetic corpus")
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--captions", type=int, default=10)
+    parser.add_argument("--equations", type=int, default=10)
+    parser.add_argument("--images", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--check-latex-samples", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compress", action="store_true")
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--baseline", help="previous output to compare against")
+    args = parser.parse_args()
+
+    report = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "scales": {},
+    }
+    for num_papers in args.scales:
+        with tempfile.TemporaryDirectory(prefix="papermint-bench-") as work_dir:
+            print(f"Benchmarking {num_papers} papers...", file=sys.stderr)
+            report["scales"][str(num_papers)] = bench_scale(
+                work_dir, num_papers, args.seed, args
+            )
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        for scale, stages in report["scales"].items():
+            for stage, result in stages.items():
+                old = baseline["scales"].get(scale, {}).get(stage, {})
+                if "seconds" in result and old.get("seconds"):
+                    speedup = old["seconds"] / result["seconds"]
+                    print(f"{scale:>8} {stage:<20} {speedup:6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
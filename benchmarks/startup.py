@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import subprocess
+from argparse import ArgumentParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import-time budget for the CLI and the mint package, measured with
+# `python -X importtime` on top of a bare interpreter start:
+#   python -m benchmarks.startup --budget-ms 100
+# tests/test_startup.py holds every command to the same import-time budget.
+BUDGET_MS = 100
+COMMANDS = {
+    "main.py --help": [os.path.join(ROOT, "main.py"), "--help"],
+    "import main": ["-c", "import main"],
+    "import mint.pipeline": ["-c", "import mint.pipeline"],
+    "import mint.pandoc_utils": ["-c", "import mint.pandoc_utils"],
+}
+
+
+def import_times(args):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.decode().splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Only top-level imports; nested ones are included in their parent
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def wall_time(args, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *args], cwd=ROOT, stdout=subprocess.DEVNULL, check=True
+        )
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = ArgumentParser(description="Check CLI and package startup budgets")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    # Modules a bare interpreter imports anyway don't count against the budget
+    baseline = import_times(["-c", "pass"])
+    bare = wall_time(["-c", "pass"], args.runs)
+    failed = False
+    for label, command in COMMANDS.items():
+        times = import_times(command)
+        times = {name: us for name, us in times.items() if name not in baseline}
+        import_ms = sum(times.values()) / 1000
+        wall_ms = (wall_time(command, args.runs) - bare) * 1000
+        ok = import_ms < args.budget_ms and wall_ms < args.budget_ms
+        failed |= not ok
+        print(
+            f"{'ok' if ok else 'OVER':<5}{label:<28}"
+            f"imports {import_ms:7.1f} ms  wall {wall_ms:7.1f} ms"
+        )
+        for name, us in sorted(times.items(), key=lambda t: -t[1])[: args.top]:
+            print(f"{'':<9}{name:<40}{us / 1000:7.1f} ms")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import os
+import io
+import gzip
+import random
+import tarfile
+from PIL import Image
+
+WORDS = (
+    "graph manifold operator kernel lattice sequence bound estimate measure "
+    "spectrum network tensor gradient convergence entropy protocol attack "
+    "signal sample theorem lemma proof distribution variance threshold"
+).split()
+
+EQUATIONS = [
+    r"\sum_{i=1}^{n} x_i^2 \leq C \|x\|_2^2",
+    r"\int_0^\infty e^{-t} t^{s-1} \, dt = \Gamma(s)",
+    r"\mathbb{E}[X] = \sum_{k} k \, P(X = k)",
+    r"f(x) = \frac{1}{\sqrt{2\pi\sigma^2}} e^{-\frac{(x-\mu)^2}{2\sigma^2}}",
+    r"\nabla \cdot \mathbf{E} = \frac{\rho}{\varepsilon_0}",
+]
+
+IMAGE_MODES = ["RGB", "RGBA", "L", "P"]
+IMAGE_SIZES = [(64, 48), (320, 240), (800, 600), (1600, 1200)]
+
+
+def sentence(rng, n=12):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def tex_source(rng, num_captions, num_equations, paragraphs=20):
+    parts = [r"\documentclass{article}", r"\begin{document}"]
+    for i in range(max(paragraphs, num_captions, num_equations)):
+        parts.append(" ".join(sentence(rng) for _ in range(4)))
+        if i < num_captions:
+            parts.append(
+                r"\begin{figure}\caption{" + sentence(rng, rng.randint(4, 16)) + "}"
+                r"\end{figure}"
+            )
+        if i < num_equations:
+            parts.append(f"$${rng.choice(EQUATIONS)}$$")
+    parts.append(r"\end{document}")
+    return "\n\n".join(parts)
+
+
+def image_bytes(rng, fmt):
+    mode = "RGB" if fmt == "JPEG" else rng.choice(IMAGE_MODES)
+    size = rng.choice(IMAGE_SIZES)
+    # Half the images are diagram-like with a white background
+    background = 255 if rng.random() < 0.5 else rng.randint(0, 200)
+    img = Image.new("RGB", size, (background, background, background))
+    for _ in range(8):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = rng.randrange(x0, size[0] + 1), rng.randrange(y0, size[1] + 1)
+        colour = tuple(rng.randrange(256) for _ in range(3))
+        img.paste(colour, (x0 + 1, y0 + 1, max(x0 + 1, x1), max(y0 + 1, y1)))
+    if mode != "RGB":
+        img = img.convert(mode)
+    buf = io.BytesIO()
+    img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def eprint_tarball(rng, num_captions, num_equations, num_images):
+    buf = io.BytesIO()
+    with tarfile.open(mode="w:gz", fileobj=buf) as tar:
+        members = [("main.tex", tex_source(rng, num_captions, num_equations).encode())]
+        for i in range(num_images):
+            fmt = rng.choice(["PNG", "JPEG"])
+            ext = "png" if fmt == "PNG" else "jpg"
+            members.append((f"figures/fig{i}.{ext}", image_bytes(rng, fmt)))
+        members.append(("README", b"not extracted"))
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = 0
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def eprint_gzip(rng, num_captions, num_equations):
+    return gzip.compress(tex_source(rng, num_captions, num_equations).encode(), mtime=0)
+
+
+def generate_corpus(
+    corpus_dir,
+    num_papers,
+    num_captions=10,
+    num_equations=10,
+    num_images=4,
+    gzip_fraction=0.2,
+    seed=0,
+):
+    rng = random.Random(seed)
+    os.makedirs(corpus_dir, exist_ok=True)
+    paths = []
+    for i in range(num_papers):
+        if rng.random() < gzip_fraction:
+            data = eprint_gzip(rng, num_captions, num_equations)
+        else:
+            data = eprint_tarball(rng, num_captions, num_equations, num_images)
+        path = os.path.join(corpus_dir, f"{i:06d}.eprint")
+        with open(path, "wb") as f:
+            f.write(data)
+        paths.append(path)
+    return paths
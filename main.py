@@ -2,18 +2,15 @@ import os
 import sys
 import shutil
 import time
-import tempfile
 import hashlib
 import random
 import re
-import requests
-import subprocess
 import unicodedata
-import multiprocessing
-from PIL import Image
-from pylatex import Document, Section, Subsection, Command
-from pylatex.utils import italic, NoEscape
+import importlib.util
 from argparse import ArgumentParser
+from mint import corpus_fs, generate_metadata, profiling, progress, runner
+from mint.compressed_io import open_text, open_write
+from mint.stages import Stage, run_stages
 
 # Constants and Variables
 TEMP_DIR = "/tmp/paperify"
@@ -23,6 +20,8 @@ MAX_CONCURRENCY = 32
 FIGURE_PROB = 25
 EQUATION_PROB = 25
 MAX_SIZE = 2500000
+MAX_PAPER_SIZE = 50000000
+MAX_MEMBER_SIZE = 10000000
 MIN_EQUATION_LENGTH = 5
 MAX_EQUATION_LENGTH = 120
 MIN_CAPTION_LENGTH = 20
@@ -32,7 +31,9 @@ SKIP_DOWNLOADING = False
 SKIP_REGENERATING_METADATA = False
 SKIP_EXTRACTING = False
 SKIP_FILTERING = False
+COMPRESS = False
 CHATGPT_TOKEN = None
+ON_PROGRESS = None
 
 
 def echo(*args):
@@ -57,6 +58,8 @@ def log(*args):
 
 
 def worker_wait():
+    import multiprocessing
+
     while len(multiprocessing.active_children()) >= MAX_CONCURRENCY:
         time.sleep(0.1)
 
@@ -88,9 +91,8 @@ def args_required(expecting, *args):
 def check_requirements():
     required_packages = ["pandoc", "requests", "PIL", "PyPDF2", "pylatex"]
     for package in required_packages:
-        try:
-            __import__(package)
-        except ImportError:
+        # find_spec locates the package without paying for importing it
+        if importlib.util.find_spec(package) is None:
             error_exit(f"{package} must be installed for {sys.argv[0]} to run.")
 
 
@@ -98,22 +100,53 @@ def parse_args():
     parser = ArgumentParser()
     parser.add_argument("--temp-dir", default=TEMP_DIR)
     parser.add_argument("--from-format", default=None)
-    parser.add_argument("--arxiv-category", default=ARXIV_CAT)
+    parser.add_argument(
+        "--arxiv-category",
+        default=ARXIV_CAT,
+        help="comma-separated categories or search queries",
+    )
     parser.add_argument("--num-papers", type=int, default=NUM_PAPERS)
     parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY)
     parser.add_argument("--figure-frequency", type=int, default=FIGURE_PROB)
     parser.add_argument("--equation-frequency", type=int, default=EQUATION_PROB)
     parser.add_argument("--max-size", type=int, default=MAX_SIZE)
+    parser.add_argument("--max-paper-size", type=int, default=MAX_PAPER_SIZE)
+    parser.add_argument("--max-member-size", type=int, default=MAX_MEMBER_SIZE)
     parser.add_argument("--min-equation-length", type=int, default=MIN_EQUATION_LENGTH)
     parser.add_argument("--max-equation-length", type=int, default=MAX_EQUATION_LENGTH)
     parser.add_argument("--min-caption-length", type=int, default=MIN_CAPTION_LENGTH)
     parser.add_argument("--chatgpt-token", default=None)
     parser.add_argument("--chatgpt-topic", default=CHATGPT_TOPIC)
     parser.add_argument("--quiet", action="store_true")
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="keep TeX sources and snippets gzipped on disk",
+    )
     parser.add_argument("--skip-downloading", action="store_true")
     parser.add_argument("--skip-extracting", action="store_true")
     parser.add_argument("--skip-metadata", action="store_true")
+    parser.add_argument(
+        "--metadata-timeout", type=float, default=generate_metadata.METADATA_TIMEOUT
+    )
     parser.add_argument("--skip-filtering", action="store_true")
+    parser.add_argument(
+        "--force",
+        action="append",
+        choices=[stage.name for stage in pipeline_stages()],
+        default=[],
+    )
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--cprofile", action="store_true")
+    parser.add_argument("--optimize-pdf", action="store_true")
+    parser.add_argument(
+        "--max-corpus-bytes",
+        type=int,
+        help="evict the least recently used corpus files above this size",
+    )
+    parser.add_argument(
+        "--progress-log", help="append progress events to this file as JSON lines"
+    )
     parser.add_argument("url_or_path")
     parser.add_argument("output_file")
     args = parser.parse_args()
@@ -126,10 +159,7 @@ def open_temp_dir():
     os.chdir(TEMP_DIR)
 
 
-def dump_latex_template():
-    with open("template.tex", "w") as f:
-        f.write(
-            r"""
+LATEX_TEMPLATE = r"""
         \documentclass{article}
         \usepackage{amsmath, amssymb, amsfonts}
         \usepackage{graphicx}
@@ -140,132 +170,60 @@ def dump_latex_template():
         \section{Introduction}
         \end{document}
         """
-        )
 
 
-def dump_yaml_template():
-    if SKIP_REGENERATING_METADATA and os.path.exists("metadata.md"):
-        return
-    elif CHATGPT_TOKEN and not SKIP_REGENERATING_METADATA:
-        log("Generating paper metadata with ChatGPT...")
-        response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={"Authorization": f"Bearer {CHATGPT_TOKEN}"},
-            json={
-                "model": "gpt-3.5-turbo",
-                "messages": [
-                    {"role": "system", "content": "You are a JSON generator..."},
-                    {"role": "user", "content": f"Generate a valid JSON object..."},
-                ],
-            },
-        )
-        metadata = response.json()["choices"][0]["message"]["content"]
-        with open("metadata.json", "w") as f:
-            f.write(metadata)
-        log(f"Generated metadata for '{metadata['paper_title']}'")
-        with open("metadata.md", "w") as f:
-            f.write(
-                f"""
-            ---
-            documentclass: IEEEtran
-            classoption:
-              - journal
-              - letterpaper
-            journal: |
-              {metadata['journal_name']}
-            title: |
-              {metadata['paper_title']}
-            thanks: |
-              {metadata['thanks']}
-            author: 
-              - |
-                {metadata['author_name']}
-
-                {metadata['author_organization']}
-
-                [{metadata['author_email']}](mailto:{metadata['author_email']})
-            abstract: |
-              {metadata['paper_abstract']}
-            ...
-            """
-            )
-    else:
-        with open("metadata.md", "w") as f:
-            f.write(
-                """
-            ---
-            documentclass: IEEEtran
-            classoption:
-              - journal
-              - letterpaper
-            journal: |
-              International Journal of Cybersecurity Research (IJCR)
-            title: |
-              Adaptive Threat Intelligence Framework for Proactive Cyber Defense
-            thanks: |
-              The authors would like to express their gratitude to the Cybersecurity
-              Research Institute (CRI) for providing valuable resources and support
-              during the research process
-            author: 
-              - |
-                Emily Collins, PhD
-
-                Cybersecurity Institute for Advanced Research (CIAR)
-
-                [`ecollins@ciar.org`](mailto:ecollins@ciar.org)
-            abstract: |
-              In this paper, we present a novel approach for detecting advanced persistent
-              threats (APTs) using deep learning techniques. APTs pose significant
-              challenges to traditional security systems due to their stealthy and
-              persistent nature. Our proposed method leverages a combination of
-              convolutional neural networks and recurrent neural networks to analyze
-              large-scale network traffic data. We introduce a novel attention mechanism
-              that identifies subtle patterns in the data, enabling the detection of APTs
-              with high accuracy. Experimental results on real-world datasets demonstrate
-              the effectiveness of our approach in identifying previously unknown APTs
-              while minimizing false positives. The framework offers a promising solution
-              for enhancing the security posture of modern network infrastructures against
-              sophisticated cyber threats.
-            ...
-            """
-            )
+def dump_latex_template():
+    with open("template.tex", "w") as f:
+        f.write(LATEX_TEMPLATE)
 
 
 def download_papers():
-    if SKIP_DOWNLOADING:
-        return
+    from mint.arxiv_listing import iter_listing
+    from mint.download_papers import (
+        EprintTooLarge,
+        extract_eprint,
+        fetch_eprint,
+        write_report,
+    )
+
     log("Downloading papers...")
     os.makedirs("images", exist_ok=True)
     os.makedirs("tex", exist_ok=True)
     os.makedirs("unknown_files", exist_ok=True)
-    response = requests.get(
-        f"https://arxiv.org/list/{ARXIV_CAT}/current?skip=0&show={NUM_PAPERS}"
+    urls = (
+        f"https://arxiv.org/e-print/{arxiv_id}"
+        for arxiv_id in iter_listing(ARXIV_CAT, NUM_PAPERS)
     )
-    urls = re.findall(r'href="/format/[^"]*"', response.text)
-    urls = [f"https://arxiv.org/e-print/{url[14:-1]}" for url in urls]
-    for url in urls:
-        worker_wait()
-        response = requests.get(url)
-        with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-            tmp_file.write(response.content)
-            tmp_file.flush()
-            os.system(f"tar -xf {tmp_file.name} -C images/")
-            os.remove(tmp_file.name)
-    for root, dirs, files in os.walk("images"):
-        for file in files:
-            if file.endswith(".tex"):
-                shutil.move(os.path.join(root, file), "tex/")
-
-
-def deduplicate():
-    if SKIP_DOWNLOADING:
-        return
-    for d in os.listdir():
+    skipped_papers, skipped_members = [], []
+    with progress.tracker(ON_PROGRESS, "download", NUM_PAPERS) as tracker:
+        for url in urls:
+            nbytes = 0
+            try:
+                data = fetch_eprint(url, MAX_PAPER_SIZE)
+                nbytes = len(data.getbuffer())
+                # tex and image members go straight to tex/ and images/
+                for member in extract_eprint(
+                    ".", data, max_member_size=MAX_MEMBER_SIZE, compress=COMPRESS
+                ):
+                    skipped_members.append({"paper": url, **member})
+            except EprintTooLarge as e:
+                log(f"Skipping {url}: {e}")
+                skipped_papers.append({"paper": url, "url": url, "reason": str(e)})
+            except Exception as e:
+                # A 404, timeout or reset only loses this paper
+                error(f"Error processing {url}: {e}")
+            tracker.update(1, nbytes)
+    write_report(
+        ".", MAX_PAPER_SIZE, MAX_MEMBER_SIZE, skipped_papers, skipped_members
+    )
+
+
+def deduplicate(*dirs):
+    for d in dirs or os.listdir():
         if os.path.isdir(d):
             log(f"Deduplicating {os.path.abspath(d)}...")
             hashes = {}
-            for file in os.listdir(d):
-                file_path = os.path.join(d, file)
+            for file_path in list(corpus_fs.iter_paths(d)):
                 with open(file_path, "rb") as f:
                     file_hash = hashlib.sha256(f.read()).hexdigest()
                     if file_hash in hashes:
@@ -275,64 +233,62 @@ def deduplicate():
 
 
 def filter_large_files():
-    if SKIP_FILTERING:
-        return
     log(f"Removing images greater than {MAX_SIZE} bytes...")
     os.makedirs("big_images", exist_ok=True)
-    for file in os.listdir("images"):
-        file_path = os.path.join("images", file)
-        if os.path.getsize(file_path) > MAX_SIZE:
-            shutil.move(file_path, "big_images/")
+    entries = list(corpus_fs.iter_files("images"))
+    with progress.tracker(ON_PROGRESS, "filter_large_files", len(entries)) as tracker:
+        for entry in entries:
+            size = entry.stat().st_size
+            if size > MAX_SIZE:
+                corpus_fs.move(entry.path, "big_images")
+            tracker.update(1, size)
 
 
 def filter_diagrams():
-    if not Image or SKIP_FILTERING:
+    try:
+        from PIL import Image
+    except ImportError:
         return
     log("Removing non-diagram images...")
     os.makedirs("non_diagram_images", exist_ok=True)
-    total = len(os.listdir("images"))
-    num = 0
-    for file in os.listdir("images"):
-        worker_wait()
-        file_path = os.path.join("images", file)
-        img = Image.open(file_path)
-        if (
-            img.getpixel((0, 0))[0] < 250
-            or img.getpixel((img.width - 1, img.height - 1))[0] < 250
-        ):
-            shutil.move(file_path, "non_diagram_images/")
-        num += 1
-        if not QUIET:
-            print(f"\r{100 * num // total}% complete...", end="", file=sys.stderr)
-    print()
+    image_paths = list(corpus_fs.iter_paths("images"))
+    with progress.tracker(ON_PROGRESS, "filter_diagrams", len(image_paths)) as tracker:
+        for file_path in image_paths:
+            worker_wait()
+            img = Image.open(file_path)
+            if (
+                img.getpixel((0, 0))[0] < 250
+                or img.getpixel((img.width - 1, img.height - 1))[0] < 250
+            ):
+                corpus_fs.move(file_path, "non_diagram_images")
+            tracker.update()
 
 
 def extract_captions():
-    if SKIP_EXTRACTING:
-        return
     log("Generating and testing figure captions...")
     with open("unchecked_captions.txt", "w") as f:
-        for file in os.listdir("tex"):
-            with open(os.path.join("tex", file), "r") as tex_file:
+        for file_path in corpus_fs.iter_paths("tex"):
+            with open_text(file_path) as tex_file:
                 f.write("\n".join(re.findall(r"\\caption{[^{}]+}", tex_file.read())))
     with open("unchecked_captions.txt", "r") as f:
         captions = f.read().splitlines()
     captions = list(set(captions))
     captions = [caption for caption in captions if len(caption) >= MIN_CAPTION_LENGTH]
     random.shuffle(captions)
-    with open("captions.txt", "w") as f:
+    tracker = progress.tracker(ON_PROGRESS, "extract_captions", len(captions))
+    with tracker, open_write("captions.txt", COMPRESS) as f:
         for caption in captions:
             if check_latex(caption):
                 f.write(caption + "\n")
+            tracker.update(1, len(caption))
 
 
 def extract_equations():
-    if SKIP_EXTRACTING:
-        return
     log("Generating and testing equations...")
-    with open("equations.txt", "w") as f:
-        for file in os.listdir("tex"):
-            with open(os.path.join("tex", file), "r") as tex_file:
+    tracker = progress.tracker(ON_PROGRESS, "extract_equations")
+    with tracker, open_write("equations.txt", COMPRESS) as f:
+        for file_path in corpus_fs.iter_paths("tex"):
+            with open_text(file_path) as tex_file:
                 equations = re.findall(r"\$\$.*?\$\$", tex_file.read())
                 equations = [
                     eq
@@ -340,98 +296,173 @@ def extract_equations():
                     if MIN_EQUATION_LENGTH <= len(eq) <= MAX_EQUATION_LENGTH
                 ]
                 random.shuffle(equations)
+                tracker.add_total(len(equations))
                 for eq in equations:
                     if check_latex(eq):
                         f.write(eq + "\n")
+                    tracker.update(1, len(eq))
+
+
+def fold_ascii(text):
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
 
 
 def build_paper():
-    if not re.search(r"\.(html|php)$", ORIGINAL_FILE_URL) and not re.search(
-        r"http.*\/[^.]*$", ORIGINAL_FILE_URL
+    import requests
+
+    input_file = ORIGINAL_FILE_URL
+    if not re.search(r"\.(html|php)$", input_file) and not re.search(
+        r"http.*\/[^.]*$", input_file
     ):
         log("Downloading input file...")
-        response = requests.get(ORIGINAL_FILE_URL)
-        with open(f"input.{FROM_FORMAT}", "wb") as f:
-            f.write(response.content)
-        ORIGINAL_FILE_URL = f"input.{FROM_FORMAT}"
+        with requests.get(input_file, stream=True) as response:
+            with open(f"input.{FROM_FORMAT}", "wb") as f:
+                for chunk in response.iter_content(1 << 20):
+                    profiling.count("bytes_downloaded", len(chunk))
+                    f.write(chunk)
+        input_file = f"input.{FROM_FORMAT}"
 
     log("Building paper...")
-    with open("output.md", "w") as f:
-        f.write(
-            subprocess.check_output(
-                [
-                    "pandoc",
-                    "--from",
-                    FROM_FORMAT,
-                    "--to",
-                    "gfm",
-                    "--wrap",
-                    "none",
-                    "--extract-media",
-                    "media",
-                    ORIGINAL_FILE_URL,
-                ]
-            ).decode("utf-8")
-        )
+    runner.run(
+        [
+            "pandoc",
+            "--from",
+            FROM_FORMAT,
+            "--to",
+            "gfm",
+            "--wrap",
+            "none",
+            "--extract-media",
+            "media",
+            "--output",
+            "converted.md",
+            input_file,
+        ],
+        memory_limit=None,
+        check=True,
+    )
 
-    with open("output.md", "r") as f:
-        content = f.read()
-    content = re.sub(r"cover\.\(jpe?g\|png\)", "", content)
-    content = re.sub(r"!\[.*\](.*\.\(svg\|gif\))", "", content)
-    lines = content.splitlines()
-    with open("output.md", "w") as f:
-        for line in lines:
-            f.write(line + "\n")
-            if rand_int(FIGURE_PROB) == 1:
-                with open("captions.txt", "r") as captions_file:
-                    captions = captions_file.read().splitlines()
-                caption = random.choice(captions)
-                with open("images", "r") as images_file:
-                    images = images_file.read().splitlines()
-                image = random.choice(images)
-                f.write(f"\n\n![{caption}]({image})\n\n")
-            elif rand_int(EQUATION_PROB) == 1:
-                with open("equations.txt", "r") as equations_file:
-                    equations = equations_file.read().splitlines()
-                equation = random.choice(equations)
-                f.write(f"\n\n{equation}\n\n")
-
-    with open("output.md", "r") as f:
-        content = f.read()
-    content = (
-        unicodedata.normalize("NFKD", content).encode("ascii", "ignore").decode("ascii")
+    with open_text("captions.txt") as f:
+        captions = f.read().splitlines()
+    with open_text("equations.txt") as f:
+        equations = f.read().splitlines()
+    images = list(corpus_fs.iter_paths("images"))
+
+    # One streaming pass: strip unwanted media, insert random figures and
+    # equations, and fold to ASCII, writing output.md behind the metadata.
+    with open("output.md", "w") as out:
+        with open("metadata.md", "r") as f:
+            out.write(f.read())
+        with open("converted.md", "r") as f:
+            for line in f:
+                line = re.sub(r"cover\.\(jpe?g\|png\)", "", line)
+                line = re.sub(r"!\[.*\](.*\.\(svg\|gif\))", "", line)
+                if rand_int(FIGURE_PROB) == 1 and captions and images:
+                    caption, image = random.choice(captions), random.choice(images)
+                    line += f"\n\n![{caption}]({image})\n\n"
+                elif rand_int(EQUATION_PROB) == 1 and equations:
+                    line += f"\n\n{random.choice(equations)}\n\n"
+                out.write(fold_ascii(line))
+
+    runner.run(
+        [
+            "pandoc",
+            "--from",
+            "markdown",
+            "--to",
+            "latex",
+            "--template",
+            "template.tex",
+            "--output",
+            "output.tex",
+            "output.md",
+        ],
+        memory_limit=None,
+        check=True,
     )
-    with open("output.md", "w") as f:
-        f.write(content)
-
-    with open("metadata.md", "r") as f:
-        metadata = f.read()
-    with open("output.md", "r") as f:
-        content = f.read()
-    with open("output.tex", "w") as f:
-        f.write(
-            subprocess.check_output(
-                [
-                    "pandoc",
-                    "--from",
-                    "markdown",
-                    "--to",
-                    "latex",
-                    "--template",
-                    "template.tex",
-                    "-",
-                    metadata + content,
-                ]
-            ).decode("utf-8")
-        )
 
-    os.system("pdflatex output.tex")
+    runner.run(
+        ["pdflatex", "-interaction=nonstopmode", "-halt-on-error", "output.tex"],
+        check=True,
+    )
+
+
+def download_and_deduplicate():
+    download_papers()
+    deduplicate("images", "tex")
+
+
+def pipeline_stages():
+    # Stages declare what they read and write so the scheduler can skip the
+    # ones that are up to date and run independent ones in parallel.
+    return [
+        Stage(
+            "template",
+            dump_latex_template,
+            outputs=["template.tex"],
+            params={"template": hashlib.sha256(LATEX_TEMPLATE.encode()).hexdigest()},
+        ),
+        Stage(
+            "download",
+            download_and_deduplicate,
+            outputs=["images", "tex", "download_report.json"],
+            params={
+                "arxiv_category": ARXIV_CAT,
+                "num_papers": NUM_PAPERS,
+                "max_paper_size": MAX_PAPER_SIZE,
+                "max_member_size": MAX_MEMBER_SIZE,
+            },
+        ),
+        Stage(
+            "filter_large_files",
+            filter_large_files,
+            inputs=["images"],
+            outputs=["images", "big_images"],
+            params={"max_size": MAX_SIZE},
+        ),
+        Stage(
+            "filter_diagrams",
+            filter_diagrams,
+            inputs=["images"],
+            outputs=["images", "non_diagram_images"],
+        ),
+        Stage(
+            "extract_captions",
+            extract_captions,
+            inputs=["tex", "template.tex"],
+            outputs=["captions.txt"],
+            params={"min_caption_length": MIN_CAPTION_LENGTH},
+        ),
+        Stage(
+            "extract_equations",
+            extract_equations,
+            inputs=["tex", "template.tex"],
+            outputs=["equations.txt"],
+            params={
+                "min_equation_length": MIN_EQUATION_LENGTH,
+                "max_equation_length": MAX_EQUATION_LENGTH,
+            },
+        ),
+    ]
+
+
+def skipped_stages():
+    # The --skip-* flags are explicit overrides; stages are otherwise skipped
+    # automatically when their inputs, parameters and outputs are unchanged.
+    skip = set()
+    if SKIP_DOWNLOADING:
+        skip.add("download")
+    if SKIP_FILTERING:
+        skip.update({"filter_large_files", "filter_diagrams"})
+    if SKIP_EXTRACTING:
+        skip.update({"extract_captions", "extract_equations"})
+    return skip
 
 
 def main():
-    check_requirements()
     args = parse_args()
-    global TEMP_DIR, FROM_FORMAT, ARXIV_CAT, NUM_PAPERS, MAX_CONCURRENCY, FIGURE_PROB, EQUATION_PROB, MAX_SIZE, MIN_EQUATION_LENGTH, MAX_EQUATION_LENGTH, MIN_CAPTION_LENGTH, CHATGPT_TOPIC, QUIET, SKIP_DOWNLOADING, SKIP_REGENERATING_METADATA, SKIP_EXTRACTING, SKIP_FILTERING, ORIGINAL_FILE_URL, OUTPUT_FILE
+    check_requirements()
+    global TEMP_DIR, FROM_FORMAT, ARXIV_CAT, NUM_PAPERS, MAX_CONCURRENCY, FIGURE_PROB, EQUATION_PROB, MAX_SIZE, MAX_PAPER_SIZE, MAX_MEMBER_SIZE, MIN_EQUATION_LENGTH, MAX_EQUATION_LENGTH, MIN_CAPTION_LENGTH, CHATGPT_TOPIC, QUIET, SKIP_DOWNLOADING, SKIP_REGENERATING_METADATA, SKIP_EXTRACTING, SKIP_FILTERING, COMPRESS, ORIGINAL_FILE_URL, OUTPUT_FILE, CHATGPT_TOKEN, ON_PROGRESS
     TEMP_DIR = args.temp_dir
     FROM_FORMAT = args.from_format
     ARXIV_CAT = args.arxiv_category
@@ -440,30 +471,63 @@ def main():
     FIGURE_PROB = args.figure_frequency
     EQUATION_PROB = args.equation_frequency
     MAX_SIZE = args.max_size
+    MAX_PAPER_SIZE = args.max_paper_size
+    MAX_MEMBER_SIZE = args.max_member_size
     MIN_EQUATION_LENGTH = args.min_equation_length
     MAX_EQUATION_LENGTH = args.max_equation_length
     MIN_CAPTION_LENGTH = args.min_caption_length
     CHATGPT_TOPIC = args.chatgpt_topic
     QUIET = args.quiet
+    COMPRESS = args.compress
     SKIP_DOWNLOADING = args.skip_downloading
     SKIP_REGENERATING_METADATA = args.skip_metadata
     SKIP_EXTRACTING = args.skip_extracting
     SKIP_FILTERING = args.skip_filtering
     ORIGINAL_FILE_URL = args.url_or_path
     OUTPUT_FILE = args.output_file
+    CHATGPT_TOKEN = args.chatgpt_token
+    # Progress goes to stderr unless --quiet, and to --progress-log if given
+    progress_log = None
+    if args.progress_log:
+        progress_log = progress.json_lines_sink(os.path.abspath(args.progress_log))
+    ON_PROGRESS = progress.combine(None if QUIET else progress.cli_sink(), progress_log)
 
     open_temp_dir()
-    dump_latex_template()
-    dump_yaml_template()
-    download_papers()
-    deduplicate()
-    filter_large_files()
-    filter_diagrams()
-    deduplicate()
-    extract_captions()
-    extract_equations()
-    build_paper()
+    if args.profile or args.cprofile:
+        profiling.enable(
+            os.path.join(TEMP_DIR, "profiles") if args.cprofile else None
+        )
+    # Metadata is fetched alongside the corpus stages and joined before the build
+    metadata = None
+    if not (SKIP_REGENERATING_METADATA and os.path.exists("metadata.md")):
+        log("Generating paper metadata...")
+        metadata = generate_metadata.start_metadata(
+            CHATGPT_TOKEN, CHATGPT_TOPIC, timeout=args.metadata_timeout
+        )
+    run_stages(
+        TEMP_DIR,
+        pipeline_stages(),
+        force=set(args.force),
+        skip=skipped_stages(),
+        callback=lambda name, status: log(f"[{name}] {status}"),
+    )
+    if metadata is not None:
+        generate_metadata.finish_metadata(TEMP_DIR, metadata, args.metadata_timeout)
+    with profiling.stage("build_paper"):
+        build_paper()
+    if args.optimize_pdf:
+        from mint.pdf_postprocess import postprocess_pdf
+
+        report = postprocess_pdf("output.pdf")
+        log(f"Optimized PDF, saved {report['bytes_saved']} bytes")
     shutil.copy("output.pdf", OUTPUT_FILE)
+    if args.max_corpus_bytes is not None:
+        from mint import corpus_store
+
+        corpus_store.enforce_budget(TEMP_DIR, args.max_corpus_bytes)
+    if profiling.report():
+        profiling.write_report(os.path.join(TEMP_DIR, "profile.json"))
+        log(f"Wrote profiling report to {os.path.join(TEMP_DIR, 'profile.json')}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+import re
+import time
+import queue
+import logging
+import threading
+import concurrent.futures
+import xml.etree.ElementTree as ET
+from mint import profiling
+
+# Listing pages come straight from the export API and are fetched ahead of
+# the downloads, which start on the first ids while later pages are in flight.
+# arXiv asks for no more than one export API call every three seconds, so
+# every call, retries included, waits its turn across all threads.
+EXPORT_API_URL = "http://export.arxiv.org/api/query"
+PAGE_SIZE = 200
+RETRIES = 3
+RETRY_DELAY = 3
+MIN_INTERVAL = 3
+NAMESPACES = {
+    "atom": "http://www.w3.org/2005/Atom",
+    "opensearch": "http://a9.com/-/spec/opensearch/1.1/",
+}
+DONE = object()
+_next_request = 0.0
+_request_lock = threading.Lock()
+
+
+def parse_queries(categories):
+    # "math, cs.CR" or ["math", "cs.CR"]; anything with a colon is passed
+    # through as a raw search query, e.g. "au:turing"
+    if isinstance(categories, str):
+        categories = categories.split(",")
+    queries = []
+    for category in categories:
+        category = category.strip()
+        if category:
+            queries.append(category if ":" in category else f"cat:{category}")
+    return queries
+
+
+def parse_page(xml):
+    root = ET.fromstring(xml)
+    total = root.findtext("opensearch:totalResults", "0", NAMESPACES)
+    ids = []
+    for entry in root.iterfind("atom:entry", NAMESPACES):
+        # Errors come back as entries whose id is not an abstract URL
+        entry_id = entry.findtext("atom:id", "", NAMESPACES)
+        if "/abs/" in entry_id:
+            ids.append(entry_id.rsplit("/abs/", 1)[1])
+    return ids, int(total)
+
+
+def wait_turn():
+    # Slots are handed out under the lock and slept on outside it
+    global _next_request
+    with _request_lock:
+        now = time.monotonic()
+        start = max(now, _next_request)
+        _next_request = start + MIN_INTERVAL
+    time.sleep(start - now)
+
+
+def fetch_page(query, start, page_size, api_url=EXPORT_API_URL):
+    import requests
+
+    ids, total = [], 0
+    for attempt in range(RETRIES):
+        if attempt:
+            time.sleep(RETRY_DELAY * attempt)
+        wait_turn()
+        try:
+            response = requests.get(
+                api_url,
+                params={
+                    "search_query": query,
+                    "start": start,
+                    "max_results": page_size,
+                    "sortBy": "submittedDate",
+                    "sortOrder": "descending",
+                },
+                timeout=60,
+            )
+            response.raise_for_status()
+            ids, total = parse_page(response.content)
+        except (requests.RequestException, ET.ParseError) as e:
+            logging.warning(f"Listing {query} from {start} failed: {e}")
+            continue
+        profiling.count("listing_pages")
+        # The API now and then returns an empty page in the middle of a listing
+        if ids or start >= total:
+            return ids, total
+    logging.error(
+        f"Dropped listing page {query} from {start} after {RETRIES} attempts"
+    )
+    profiling.count("listing_pages_dropped")
+    return ids, total
+
+
+def prefetch_listing(
+    queries,
+    num_papers,
+    out,
+    max_concurrency=4,
+    page_size=PAGE_SIZE,
+    api_url=EXPORT_API_URL,
+):
+    # Puts up to num_papers ids per query on out, deduplicated across queries
+    # and versions, followed by DONE
+    seen = set()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_concurrency) as executor:
+
+            def submit(query, start):
+                size = min(page_size, num_papers - start)
+                return executor.submit(fetch_page, query, start, size, api_url)
+
+            # Only the first page of each query says how many pages follow
+            pending = {submit(query, 0): (query, 0) for query in queries}
+            while pending:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    query, start = pending.pop(future)
+                    ids, total = future.result()
+                    for arxiv_id in ids:
+                        key = re.sub(r"v\d+$", "", arxiv_id)
+                        if key not in seen:
+                            seen.add(key)
+                            out.put(arxiv_id)
+                    if start == 0:
+                        for page in range(page_size, min(num_papers, total), page_size):
+                            pending[submit(query, page)] = (query, page)
+        profiling.count("papers_listed", len(seen))
+    finally:
+        out.put(DONE)
+
+
+def iter_listing(categories, num_papers, max_concurrency=4, **kwargs):
+    out = queue.Queue()
+    threading.Thread(
+        target=prefetch_listing,
+        args=(parse_queries(categories), num_papers, out, max_concurrency),
+        kwargs=kwargs,
+        daemon=True,
+    ).start()
+    return iter(out.get, DONE)
@@ -0,0 +1,159 @@
+import os
+import re
+import json
+import uuid
+import hashlib
+import threading
+from mint import corpus_fs, profiling
+
+# The images kept from each e-print are packed back to back into one file,
+# and the index records where each one lives. Only the images a paper
+# actually uses are ever written out on their own.
+INDEX_FILE = "assets.jsonl"
+ARCHIVE_DIR = "archives"
+ASSET_DIR = "assets"
+# Most a single e-print's pack may hold; later images are left out
+MAX_ARCHIVE_SIZE = 50 * 1024 * 1024
+FIGURE = re.compile(r"\\begin\{figure\*?\}(.*?)\\end\{figure\*?\}", re.S)
+GRAPHICS = re.compile(r"\\includegraphics\s*(?:\[[^\]]*\])?\s*\{([^}]+)\}")
+CAPTION = re.compile(r"\\caption(?:\[[^\]]*\])?\{([^\{]+)\}")
+
+
+def graphics_key(path):
+    # \includegraphics may leave out the directory and the extension
+    return os.path.splitext(os.path.basename(path.strip()))[0].lower()
+
+
+def figure_captions(text):
+    # The caption of the figure each \includegraphics target appears in, so
+    # an image can be matched on what its paper says about it
+    captions = {}
+    for figure in FIGURE.findall(text):
+        caption = CAPTION.search(figure)
+        if caption:
+            for target in GRAPHICS.findall(figure):
+                captions[graphics_key(target)] = caption.group(1).strip()
+    return captions
+
+
+def load_index(temp_dir):
+    try:
+        with open(os.path.join(temp_dir, INDEX_FILE), "r") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def write_index(temp_dir, assets):
+    path = os.path.join(temp_dir, INDEX_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        f.writelines(json.dumps(asset) + "\n" for asset in assets)
+    os.replace(f"{path}.tmp", path)
+
+
+def accepted_assets(temp_dir):
+    return [asset for asset in load_index(temp_dir) if "rejected" not in asset]
+
+
+def reject(temp_dir, reason, predicate):
+    assets = load_index(temp_dir)
+    rejected = 0
+    for asset in assets:
+        if "rejected" not in asset and predicate(asset):
+            asset["rejected"] = reason
+            rejected += 1
+    if assets:
+        write_index(temp_dir, assets)
+    return rejected
+
+
+def relocate_archives(temp_dir, moves):
+    # moves maps old archive paths to new ones, e.g. after corpus_fs.migrate
+    moves = {
+        os.path.relpath(old, temp_dir): os.path.relpath(new, temp_dir)
+        for old, new in moves.items()
+    }
+    assets = load_index(temp_dir)
+    for asset in assets:
+        asset["archive"] = moves.get(asset["archive"], asset["archive"])
+    if assets:
+        write_index(temp_dir, assets)
+
+
+def read_asset(temp_dir, asset):
+    with open(os.path.join(temp_dir, asset["archive"]), "rb") as f:
+        f.seek(asset["offset"])
+        return f.read(asset["size"])
+
+
+def materialize(temp_dir, asset):
+    # Named by content, so an image picked twice is only written once
+    path = corpus_fs.new_path(
+        os.path.join(temp_dir, ASSET_DIR), f"{asset['sha256']}.{asset['ext']}"
+    )
+    if not os.path.exists(path):
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(read_asset(temp_dir, asset))
+        os.replace(tmp, path)
+        profiling.count("assets_materialized")
+    return path
+
+
+class AssetIndex:
+    def __init__(self, temp_dir):
+        self.temp_dir = temp_dir
+        self.lock = threading.Lock()
+        self.seen = {asset["sha256"] for asset in load_index(temp_dir)}
+        os.makedirs(os.path.join(temp_dir, ARCHIVE_DIR), exist_ok=True)
+
+    def add_images(self, tar, members, captions=None, max_size=MAX_ARCHIVE_SIZE):
+        # Only images not indexed before are copied out of the tar, so the
+        # members extract_eprint skipped never reach the disk. captions maps
+        # graphics_key of a member to the caption of the figure it is in.
+        captions = captions or {}
+        new, written = [], 0
+        h = hashlib.sha256()
+        tmp = os.path.join(self.temp_dir, ARCHIVE_DIR, f"{uuid.uuid4().hex}.tmp")
+        with open(tmp, "wb") as f:
+            for member in members:
+                if written + member.size > max_size:
+                    profiling.count("assets_over_budget")
+                    continue
+                data = tar.extractfile(member).read()
+                sha256 = hashlib.sha256(data).hexdigest()
+                with self.lock:
+                    if sha256 in self.seen:
+                        continue
+                    self.seen.add(sha256)
+                new.append(
+                    {
+                        "member": member.name,
+                        "ext": os.path.splitext(member.name)[1][1:].lower(),
+                        "offset": written,
+                        "size": len(data),
+                        "sha256": sha256,
+                    }
+                )
+                caption = captions.get(graphics_key(member.name))
+                if caption:
+                    new[-1]["text"] = caption
+                f.write(data)
+                h.update(data)
+                written += len(data)
+        if not new:
+            os.remove(tmp)
+            return []
+
+        path = corpus_fs.new_path(
+            os.path.join(self.temp_dir, ARCHIVE_DIR), f"{h.hexdigest()}.pack"
+        )
+        os.replace(tmp, path)
+        archive = os.path.relpath(path, self.temp_dir)
+        with self.lock:
+            with open(os.path.join(self.temp_dir, INDEX_FILE), "a") as f:
+                for asset in new:
+                    asset["archive"] = archive
+                    f.write(json.dumps(asset) + "\n")
+        profiling.count("assets_indexed", len(new))
+        return new
@@ -0,0 +1,71 @@
+import io
+import gzip
+
+# TeX sources and snippet files can be kept gzip-compressed at rest. Files keep
+# their names and readers sniff the gzip magic, so compressed and plain files
+# mix freely and stage outputs read back unchanged. Compressed files are
+# written as a series of independent gzip members, one per block, so the
+# writer only ever buffers one block.
+GZIP_MAGIC = b"\x1f\x8b"
+BLOCK_SIZE = 256 * 1024
+
+
+class BlockGzipWriter(io.RawIOBase):
+    def __init__(self, path, block_size=BLOCK_SIZE, level=6):
+        self.path = path
+        self.block_size = block_size
+        self.level = level
+        self.file = open(path, "wb")
+        self.buffer = bytearray()
+        self.written = False
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            self._flush_block(self.block_size)
+        return len(data)
+
+    def _flush_block(self, size):
+        block = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        self.file.write(gzip.compress(block, self.level, mtime=0))
+        self.written = True
+
+    def close(self):
+        if self.closed:
+            return
+        if self.buffer or not self.written:
+            self._flush_block(len(self.buffer))
+        self.file.close()
+        super().close()
+
+
+def is_compressed(path):
+    with open(path, "rb") as f:
+        return f.read(2) == GZIP_MAGIC
+
+
+def open_write(path, compress=False, encoding=None):
+    if not compress:
+        return open(path, "w", encoding=encoding)
+    return io.TextIOWrapper(io.BufferedWriter(BlockGzipWriter(path)), encoding)
+
+
+def write_bytes(path, data, compress=False):
+    if compress:
+        with BlockGzipWriter(path) as f:
+            f.write(data)
+    else:
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+def open_text(path, encoding=None, errors=None):
+    # Decompresses as it is read; multi-member files read back as one stream
+    if is_compressed(path):
+        return gzip.open(path, "rt", encoding=encoding, errors=errors)
+    return open(path, "r", encoding=encoding, errors=errors)
+
@@ -0,0 +1,96 @@
+import os
+import hashlib
+from argparse import ArgumentParser
+
+# Corpus files live two hash-prefix levels down, e.g. images/3f/a2/NAME, so no
+# directory ever holds more than a few hundred entries:
+#   python -m mint.corpus_fs migrate /tmp/paperify
+CORPUS_DIRS = [
+    "tex",
+    "images",
+    "big_images",
+    "non_diagram_images",
+    "unknown_files",
+    "assets",
+    "archives",
+]
+
+
+def shard_path(root, name):
+    h = hashlib.md5(name.encode(), usedforsecurity=False).hexdigest()
+    return os.path.join(root, h[:2], h[2:4], name)
+
+
+def new_path(root, name):
+    path = shard_path(root, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def move(path, root):
+    # Keeps the file name, which also fixes its shard in the new root
+    dest = new_path(root, os.path.basename(path))
+    os.replace(path, dest)
+    return dest
+
+
+def _scan(path, depth):
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    # Files above the shard level are from the flat layout
+                    yield entry
+                elif depth and entry.is_dir(follow_symlinks=False):
+                    yield from _scan(entry.path, depth - 1)
+    except FileNotFoundError:
+        return
+
+
+def iter_files(root):
+    # Yields os.DirEntry objects; entry.stat() is cached per entry, so callers
+    # get sizes without an extra lookup by path
+    return _scan(root, 2)
+
+
+def iter_paths(root):
+    return (entry.path for entry in iter_files(root))
+
+
+def migrate(root):
+    # Returns {old path: new path} for every file moved
+    with os.scandir(root) as entries:
+        flat = [entry.path for entry in entries if entry.is_file()]
+    return {path: move(path, root) for path in flat}
+
+
+def migrate_temp_dir(temp_dir):
+    moved = {}
+    for name in CORPUS_DIRS:
+        root = os.path.join(temp_dir, name)
+        if os.path.isdir(root):
+            moves = migrate(root)
+            if name == "archives" and moves:
+                # The asset index points into archives by path
+                from mint import asset_index
+
+                asset_index.relocate_archives(temp_dir, moves)
+            moved[name] = len(moves)
+    return moved
+
+
+def main():
+    parser = ArgumentParser(description="Manage the sharded corpus layout")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser(
+        "migrate", help="Move files from the flat layout into shards"
+    )
+    migrate_parser.add_argument("temp_dir")
+    args = parser.parse_args()
+    if args.command == "migrate":
+        for name, moved in migrate_temp_dir(args.temp_dir).items():
+            print(f"{name}: moved {moved} files")
+
+
+if __name__ == "__main__":
+    main()
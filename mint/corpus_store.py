@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from argparse import ArgumentParser
+from mint import asset_index, corpus_fs
+from mint.latex_template import FORMATS_DIR
+from mint.stages import preserve_state
+
+# Keeps a temp dir within a byte budget:
+#   python -m mint.corpus_store compact /tmp/paperify --max-bytes 2000000000
+# Compaction drops rejected and orphaned files outright. Eviction then
+# removes the least recently (or least frequently) used corpus files until
+# the budget is met. Validated snippets, metadata and stage state are never
+# touched, and neither are the files that were still in use.
+USAGE_LOG = "usage.jsonl"
+REJECT_DIRS = ["unknown_files", "big_images", "non_diagram_images"]
+SCRATCH_DIRS = ["shards", "latex_check"]
+SCRATCH_FILES = ["unchecked_captions.txt", "unchecked_equations.txt"]
+EVICTABLE_DIRS = ["assets", "images", "archives", "tex"]
+# Precompiled preamble formats are several MB each; only the most recently
+# used ones are kept
+FORMATS_KEPT = 2
+
+_lock = threading.Lock()
+
+
+def record_usage(temp_dir, paths):
+    now = time.time()
+    with _lock, open(os.path.join(temp_dir, USAGE_LOG), "a") as f:
+        for path in paths:
+            rel = os.path.relpath(path, temp_dir)
+            f.write(json.dumps({"path": rel, "time": now}) + "\n")
+
+
+def load_usage(temp_dir):
+    # {relative path: (times used, last used)}
+    usage = {}
+    try:
+        with open(os.path.join(temp_dir, USAGE_LOG), "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by a crash
+                count, last = usage.get(entry["path"], (0, 0))
+                usage[entry["path"]] = (
+                    count + entry.get("count", 1),
+                    max(last, entry["time"]),
+                )
+    except FileNotFoundError:
+        pass
+    return usage
+
+
+def _write_usage(temp_dir, usage):
+    # One line per path that still exists, so the log doesn't grow forever
+    path = os.path.join(temp_dir, USAGE_LOG)
+    with _lock:
+        with open(f"{path}.tmp", "w") as f:
+            for rel, (count, last) in sorted(usage.items()):
+                if os.path.exists(os.path.join(temp_dir, rel)):
+                    entry = {"path": rel, "time": last, "count": count}
+                    f.write(json.dumps(entry) + "\n")
+        os.replace(f"{path}.tmp", path)
+
+
+def _tree_size(path):
+    total = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    total += _tree_size(entry.path)
+                else:
+                    total += entry.stat(follow_symlinks=False).st_size
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    return total
+
+
+def _remove(path):
+    size = _tree_size(path) if os.path.isdir(path) else os.path.getsize(path)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+    return size
+
+
+def _prune_index(temp_dir):
+    # Drops index entries whose archive is gone, and archives that no longer
+    # hold an accepted image
+    assets = asset_index.load_index(temp_dir)
+    assets = [
+        asset
+        for asset in assets
+        if os.path.exists(os.path.join(temp_dir, asset["archive"]))
+    ]
+    live = {asset["archive"] for asset in assets if "rejected" not in asset}
+    freed = 0
+    archive_dir = os.path.join(temp_dir, asset_index.ARCHIVE_DIR)
+    for entry in list(corpus_fs.iter_files(archive_dir)):
+        rel = os.path.relpath(entry.path, temp_dir)
+        if rel not in live:
+            freed += _remove(entry.path)
+    assets = [asset for asset in assets if asset["archive"] in live]
+    if assets or os.path.exists(os.path.join(temp_dir, asset_index.INDEX_FILE)):
+        asset_index.write_index(temp_dir, assets)
+    return freed
+
+
+def _prune_formats(temp_dir, keep=FORMATS_KEPT):
+    # Each format leaves name.fmt, .tex, .log and maybe .failed behind
+    formats_dir = os.path.join(temp_dir, FORMATS_DIR)
+    if not os.path.isdir(formats_dir):
+        return 0
+    last_used = {}
+    for entry in os.scandir(formats_dir):
+        name = entry.name.split(".", 1)[0]
+        last_used[name] = max(last_used.get(name, 0), entry.stat().st_mtime)
+    stale = sorted(last_used, key=last_used.get, reverse=True)[keep:]
+    freed = 0
+    for entry in list(os.scandir(formats_dir)):
+        if entry.name.split(".", 1)[0] in stale:
+            freed += _remove(entry.path)
+    return freed
+
+
+def compact(temp_dir):
+    freed = 0
+    for name in REJECT_DIRS:
+        for entry in list(corpus_fs.iter_files(os.path.join(temp_dir, name))):
+            freed += _remove(entry.path)
+    for name in SCRATCH_DIRS + SCRATCH_FILES:
+        if os.path.exists(os.path.join(temp_dir, name)):
+            freed += _remove(os.path.join(temp_dir, name))
+    for name in EVICTABLE_DIRS:
+        # Left behind by writes that never finished
+        for entry in list(corpus_fs.iter_files(os.path.join(temp_dir, name))):
+            if entry.name.endswith(".tmp"):
+                freed += _remove(entry.path)
+    freed += _prune_index(temp_dir)
+    freed += _prune_formats(temp_dir)
+    return freed
+
+
+def evict(temp_dir, max_bytes, policy="lru"):
+    usage = load_usage(temp_dir)
+    total = _tree_size(temp_dir)
+    candidates = []
+    for name in EVICTABLE_DIRS:
+        for entry in corpus_fs.iter_files(os.path.join(temp_dir, name)):
+            st = entry.stat()
+            count, last = usage.get(os.path.relpath(entry.path, temp_dir), (0, 0))
+            # Files that were never used age from when they arrived
+            last = last or st.st_mtime
+            key = (last, count) if policy == "lru" else (count, last)
+            candidates.append((key, entry.path, st.st_size))
+    candidates.sort()
+
+    freed = 0
+    for _, path, size in candidates:
+        if total - freed <= max_bytes:
+            break
+        os.remove(path)
+        freed += size
+    if total - freed > max_bytes:
+        logging.warning(
+            f"{temp_dir} is {total - freed} bytes after eviction, over the "
+            f"{max_bytes} byte budget; the rest is pinned"
+        )
+    freed += _prune_index(temp_dir)
+    _write_usage(temp_dir, usage)
+    return freed
+
+
+def enforce_budget(temp_dir, max_bytes, policy="lru"):
+    # Stages whose files only shrank here stay up to date, so nothing is
+    # downloaded or extracted again just to refill the budget
+    with preserve_state(temp_dir):
+        freed = compact(temp_dir)
+        if max_bytes is not None:
+            freed += evict(temp_dir, max_bytes, policy)
+    logging.info(f"Freed {freed} bytes in {temp_dir}")
+    return freed
+
+
+def main():
+    parser = ArgumentParser(description="Keep a corpus temp dir within budget")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser(
+        "compact", help="Remove rejected and orphaned files, then evict"
+    )
+    compact_parser.add_argument("temp_dir")
+    compact_parser.add_argument("--max-bytes", type=int)
+    compact_parser.add_argument("--policy", choices=["lru", "lfu"], default="lru")
+    args = parser.parse_args()
+    if args.command == "compact":
+        freed = enforce_budget(args.temp_dir, args.max_bytes, args.policy)
+        print(f"Freed {freed} bytes, {_tree_size(args.temp_dir)} bytes in use")
+
+
+if __name__ == "__main__":
+    main()
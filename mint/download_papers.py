@@ -1,52 +1,179 @@
 import os
-import arxiv
+import json
 import requests
 import tarfile
 import gzip
 import io
 import base64
 import concurrent.futures
+from mint import corpus_fs, profiling, progress
+from mint.compressed_io import write_bytes
+from mint.arxiv_listing import iter_listing
+from mint.asset_index import AssetIndex, figure_captions
 
-def download_papers(temp_dir, arxiv_category, num_papers, max_concurrency):
+# Most e-prints are a few MB; the ones far above that are usually datasets,
+# of which only a few small tex and image members would be kept
+MAX_PAPER_SIZE = 50 * 1024 * 1024
+MAX_MEMBER_SIZE = 10 * 1024 * 1024
+REPORT_FILE = "download_report.json"
+
+
+class EprintTooLarge(Exception):
+    pass
+
+
+def fetch_eprint(url, max_paper_size=MAX_PAPER_SIZE):
+    # Gives up as soon as the archive is known to exceed the budget, either
+    # from Content-Length or from the bytes read so far
+    with requests.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        length = response.headers.get("Content-Length")
+        if length and int(length) > max_paper_size:
+            raise EprintTooLarge(f"Content-Length is {length} bytes")
+        data = io.BytesIO()
+        for chunk in response.iter_content(1 << 16):
+            profiling.count("bytes_downloaded", len(chunk))
+            data.write(chunk)
+            if data.tell() > max_paper_size:
+                raise EprintTooLarge(f"more than {max_paper_size} bytes")
+    data.seek(0)
+    return data
+
+
+def extract_eprint(
+    temp_dir,
+    data,
+    on_file=None,
+    max_member_size=MAX_MEMBER_SIZE,
+    index=None,
+    compress=False,
+):
+    ext = lambda s: os.path.splitext(s)[1][1:].lower()
+    rand = lambda n: base64.b64encode(os.urandom(n), altchars=b"__").decode("ascii")
+    _filter = lambda m: m if (not (m.name.startswith("..") or m.name.startswith("/")) and m.isfile() and ext(m.name) in {"jpg", "jpeg", "png", "tex"}) else None
+    randname = lambda f: corpus_fs.new_path(
+        os.path.join(temp_dir, "tex" if ext(f) == "tex" else "images"),
+        f"{rand(24)}.{ext(f)}",
+    )
+
+    # Members over the cap are skipped without being decompressed to disk
+    skipped, images, captions = [], [], {}
+    try:
+        with tarfile.open(mode="r", fileobj=data) as f:
+            for member in f.getmembers():
+                if _filter(member) and member.size > max_member_size:
+                    profiling.count("members_skipped")
+                    skipped.append({"member": member.name, "size": member.size})
+                elif _filter(member) and index and ext(member.name) != "tex":
+                    images.append(member)
+                elif _filter(member):
+                    path = randname(member.name)
+                    content = f.extractfile(member).read()
+                    if index and ext(member.name) == "tex":
+                        text = content.decode(errors="replace")
+                        captions.update(figure_captions(text))
+                    # Only TeX is worth compressing; images already are
+                    write_bytes(
+                        path, content, compress and ext(member.name) == "tex"
+                    )
+                    profiling.count("files_extracted")
+                    if on_file:
+                        on_file(path)
+            if images:
+                index.add_images(f, images, captions)
+    except tarfile.ReadError:
+        data.seek(0)
+        with gzip.GzipFile(fileobj=data) as f:
+            content = f.read(max_member_size + 1)
+        if len(content) > max_member_size:
+            profiling.count("members_skipped")
+            skipped.append({"member": "gzipped.tex", "size": None})
+            return skipped
+        path = randname("gzipped.tex")
+        write_bytes(path, content, compress)
+        profiling.count("files_extracted")
+        if on_file:
+            on_file(path)
+    except Exception as e:
+        print(f"Exception: {e}")
+        path = corpus_fs.new_path(os.path.join(temp_dir, "unknown_files"), rand(24))
+        with open(path, "wb") as outfile:
+            outfile.write(data.read())
+    return skipped
+
+
+def write_report(
+    temp_dir, max_paper_size, max_member_size, skipped_papers, skipped_members
+):
+    with open(os.path.join(temp_dir, REPORT_FILE), "w") as f:
+        json.dump(
+            {
+                "max_paper_size": max_paper_size,
+                "max_member_size": max_member_size,
+                "skipped_papers": sorted(skipped_papers, key=lambda p: p["paper"]),
+                "skipped_members": sorted(
+                    skipped_members, key=lambda m: (m["paper"], m["member"])
+                ),
+            },
+            f,
+            indent=2,
+        )
+
+
+def download_papers(
+    temp_dir,
+    arxiv_category,
+    num_papers,
+    max_concurrency,
+    on_file=None,
+    max_paper_size=MAX_PAPER_SIZE,
+    max_member_size=MAX_MEMBER_SIZE,
+    lazy=False,
+    compress=False,
+    on_progress=None,
+):
+    # With lazy set, images are packed per paper and indexed instead
+    # of being extracted to images/
+    index = AssetIndex(temp_dir) if lazy else None
     os.makedirs(f"{temp_dir}/images", exist_ok=True)
     os.makedirs(f"{temp_dir}/tex", exist_ok=True)
     os.makedirs(f"{temp_dir}/unknown_files", exist_ok=True)
 
-    search = arxiv.Search(
-        query=f"cat:{arxiv_category}",
-        max_results=num_papers,
-        sort_by=arxiv.SortCriterion.SubmittedDate
-    )
+    skipped_papers, skipped_members = [], []
+    # The total grows as listing pages arrive
+    tracker = progress.tracker(on_progress, "download")
+
+    def listed():
+        for arxiv_id in iter_listing(arxiv_category, num_papers):
+            tracker.add_total(1)
+            yield arxiv_id
 
-    def process_paper(paper):
+    def process_paper(arxiv_id):
+        download_url = f"https://arxiv.org/e-print/{arxiv_id}"
+        nbytes = 0
         try:
-            download_url = paper.pdf_url.replace("pdf", "e-print")
-            response = requests.get(download_url)
-            data = io.BytesIO(response.content)
-            ext = lambda s: os.path.splitext(s)[1][1:].lower()
-            rand = lambda n: base64.b64encode(os.urandom(n), altchars=b"__").decode("ascii")
-            _filter = lambda m: m if (not (m.name.startswith("..") or m.name.startswith("/")) and m.isfile() and ext(m.name) in {"jpg", "jpeg", "png", "tex"}) else None
-            randname = lambda f: f"./{rand(24)}.{ext(f)}"
-
-            try:
-                with tarfile.open(mode="r", fileobj=data) as f:
-                    for member in f.getmembers():
-                        if _filter(member):
-                            with open(randname(member.name), "wb") as outfile:
-                                outfile.write(f.extractfile(member).read())
-            except tarfile.ReadError:
-                data.seek(0)
-                with open(randname("gzipped.tex"), "wb") as outfile:
-                    outfile.write(gzip.decompress(data.read()))
-            except Exception as e:
-                print(f"Exception: {e}")
-                with open(os.path.join(temp_dir, "unknown_files", rand(24)), "wb") as outfile:
-                    outfile.write(data.read())
+            data = fetch_eprint(download_url, max_paper_size)
+            nbytes = len(data.getbuffer())
+            profiling.count("papers_downloaded")
+            for member in extract_eprint(
+                temp_dir, data, on_file, max_member_size, index, compress
+            ):
+                skipped_members.append({"paper": arxiv_id, **member})
+        except EprintTooLarge as e:
+            profiling.count("papers_skipped")
+            skipped_papers.append(
+                {"paper": arxiv_id, "url": download_url, "reason": str(e)}
+            )
         except Exception as e:
-            print(f"Error processing paper {paper.entry_id}: {e}")
+            print(f"Error processing paper {arxiv_id}: {e}")
+        tracker.update(1, nbytes)
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
-        executor.map(process_paper, search.results())
+    # arxiv_category may list several categories or queries, comma-separated.
+    # Each id is submitted as soon as its listing page arrives.
+    with tracker:
+        with concurrent.futures.ThreadPoolExecutor(max_concurrency) as executor:
+            executor.map(process_paper, listed())
 
-    for file in os.listdir(f"{temp_dir}/images"):
-        os.rename(f"{temp_dir}/images/{file}", f"{temp_dir}/tex/{file}")
\ No newline at end of file
+    write_report(
+        temp_dir, max_paper_size, max_member_size, skipped_papers, skipped_members
+    )
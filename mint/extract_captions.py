@@ -1,34 +1,45 @@
 import os
 import re
-import concurrent.futures
+from mint import corpus_fs, profiling, progress
+from mint.compressed_io import open_text, open_write
 from mint.pandoc_utils import check_latex
+from mint.snippets import validate_snippets
 
 
-def extract_captions(temp_dir, min_caption_length, max_concurrency, quiet):
+def find_captions(text):
+    captions = re.findall(r"\\caption\{([^\{]+)\}", text)
+    profiling.count("captions_found", len(captions))
+    return captions
+
+
+def extract_captions(
+    temp_dir,
+    min_caption_length,
+    max_concurrency,
+    quiet,
+    compress=False,
+    on_progress=None,
+):
     unchecked_captions_file = os.path.join(temp_dir, "unchecked_captions.txt")
     captions_file = os.path.join(temp_dir, "captions.txt")
 
     with open(unchecked_captions_file, "w") as f:
-        for file in os.listdir(os.path.join(temp_dir, "tex")):
-            file_path = os.path.join(temp_dir, "tex", file)
-            if os.path.isfile(file_path):  # Ensure it's a file, not a directory
-                with open(file_path, "r") as tex_file:
-                    f.write(
-                        "\n".join(re.findall(r"\\caption\{([^\{]+)\}", tex_file.read()))
-                    )
+        for file_path in corpus_fs.iter_paths(os.path.join(temp_dir, "tex")):
+            with open_text(file_path) as tex_file:
+                f.write("\n".join(find_captions(tex_file.read())))
 
     with open(unchecked_captions_file, "r") as f:
         captions = [
             line.strip() for line in f if len(line.strip()) >= min_caption_length
         ]
 
-    def process_caption(caption):
-        if check_latex(caption):
-            return caption
-        return None
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
-        results = list(executor.map(process_caption, captions))
+    with progress.tracker(on_progress, "extract_captions") as tracker:
+        captions = validate_snippets(
+            captions,
+            lambda caption: check_latex(caption, temp_dir),
+            max_concurrency,
+            tracker,
+        )
 
-    with open(captions_file, "w") as f:
-        f.write("\n".join(filter(None, results)))
+    with open_write(captions_file, compress) as f:
+        f.write("\n".join(captions))
@@ -1,21 +1,33 @@
 import os
 import re
-import concurrent.futures
+from mint import corpus_fs, profiling, progress
+from mint.compressed_io import open_text, open_write
 from mint.pandoc_utils import check_latex
+from mint.snippets import validate_snippets
+
+
+def find_equations(text):
+    equations = re.findall(r"\$\$([^\$]+)\$\$", text)
+    profiling.count("equations_found", len(equations))
+    return equations
 
 
 def extract_equations(
-    temp_dir, min_equation_length, max_equation_length, max_concurrency, quiet
+    temp_dir,
+    min_equation_length,
+    max_equation_length,
+    max_concurrency,
+    quiet,
+    compress=False,
+    on_progress=None,
 ):
     unchecked_equations_file = os.path.join(temp_dir, "unchecked_equations.txt")
     equations_file = os.path.join(temp_dir, "equations.txt")
 
     with open(unchecked_equations_file, "w") as f:
-        for file in os.listdir(os.path.join(temp_dir, "tex")):
-            file_path = os.path.join(temp_dir, "tex", file)
-            if os.path.isfile(file_path):  # Ensure it's a file, not a directory
-                with open(file_path, "r") as tex_file:
-                    f.write("\n".join(re.findall(r"\$\$([^\$]+)\$\$", tex_file.read())))
+        for file_path in corpus_fs.iter_paths(os.path.join(temp_dir, "tex")):
+            with open_text(file_path) as tex_file:
+                f.write("\n".join(find_equations(tex_file.read())))
 
     with open(unchecked_equations_file, "r") as f:
         equations = [
@@ -24,13 +36,13 @@ def extract_equations(
             if min_equation_length <= len(line.strip()) <= max_equation_length
         ]
 
-    def process_equation(equation):
-        if check_latex(f"$${equation}$$"):
-            return equation
-        return None
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
-        results = list(executor.map(process_equation, equations))
+    with progress.tracker(on_progress, "extract_equations") as tracker:
+        equations = validate_snippets(
+            equations,
+            lambda equation: check_latex(f"$${equation}$$", temp_dir),
+            max_concurrency,
+            tracker,
+        )
 
-    with open(equations_file, "w") as f:
-        f.write("\n".join(filter(None, results)))
+    with open_write(equations_file, compress) as f:
+        f.write("\n".join(equations))
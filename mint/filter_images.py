@@ -1,20 +1,76 @@
+import io
 import os
-import shutil
 from PIL import Image
+from mint import asset_index, corpus_fs, profiling, progress
 
 
-def filter_large_files(temp_dir, max_size):
+def is_large(path, max_size):
+    profiling.count("images_size_checked")
+    return os.path.getsize(path) > max_size
+
+
+def is_diagram(path):
+    # Diagrams have an opaque, white top-left pixel. path may also be a file
+    # object, for images that are still inside their archive.
+    profiling.count("images_decoded")
+    with Image.open(path) as img:
+        pixel = img.crop((0, 0, 1, 1)).convert("RGBA").getpixel((0, 0))
+    return pixel[3] != 0 and sum(pixel[:3]) >= 750
+
+
+def filter_image(temp_dir, path, max_size):
+    if is_large(path, max_size):
+        corpus_fs.move(path, f"{temp_dir}/big_images")
+        return False
+    if not is_diagram(path):
+        corpus_fs.move(path, f"{temp_dir}/non_diagram_images")
+        return False
+    return True
+
+
+def filter_large_files(temp_dir, max_size, on_progress=None):
     os.makedirs(f"{temp_dir}/big_images", exist_ok=True)
-    for file in os.listdir(f"{temp_dir}/images"):
-        if os.path.getsize(f"{temp_dir}/images/{file}") > max_size:
-            shutil.move(f"{temp_dir}/images/{file}", f"{temp_dir}/big_images/{file}")
+    entries = list(corpus_fs.iter_files(f"{temp_dir}/images"))
+    tracker = progress.tracker(
+        on_progress,
+        "filter_large_files",
+        len(entries) + len(asset_index.accepted_assets(temp_dir)),
+    )
+    with tracker:
+        for entry in entries:
+            profiling.count("images_size_checked")
+            size = entry.stat().st_size
+            if size > max_size:
+                corpus_fs.move(entry.path, f"{temp_dir}/big_images")
+            tracker.update(1, size)
+
+        def large(asset):
+            tracker.update(1, asset["size"])
+            return asset["size"] > max_size
+
+        asset_index.reject(temp_dir, "large", large)
 
 
-def filter_diagrams(temp_dir):
+def filter_diagrams(temp_dir, on_progress=None):
     os.makedirs(f"{temp_dir}/non_diagram_images", exist_ok=True)
-    for file in os.listdir(f"{temp_dir}/images"):
-        img = Image.open(f"{temp_dir}/images/{file}")
-        if img.getpixel((0, 0))[3] == 0 or sum(img.getpixel((0, 0))[:3]) < 750:
-            shutil.move(
-                f"{temp_dir}/images/{file}", f"{temp_dir}/non_diagram_images/{file}"
-            )
+    paths = list(corpus_fs.iter_paths(f"{temp_dir}/images"))
+    tracker = progress.tracker(
+        on_progress,
+        "filter_diagrams",
+        len(paths) + len(asset_index.accepted_assets(temp_dir)),
+    )
+    with tracker:
+        for path in paths:
+            if not is_diagram(path):
+                corpus_fs.move(path, f"{temp_dir}/non_diagram_images")
+            tracker.update()
+
+        def not_diagram(asset):
+            data = asset_index.read_asset(temp_dir, asset)
+            tracker.update(1, len(data))
+            try:
+                return not is_diagram(io.BytesIO(data))
+            except Exception:
+                return True
+
+        asset_index.reject(temp_dir, "non_diagram", not_diagram)
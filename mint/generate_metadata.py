@@ -1,35 +1,70 @@
 import os
 import json
-import requests
-
-
-def generate_metadata(temp_dir, chatgpt_token, chatgpt_topic):
-    if chatgpt_token:
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {chatgpt_token}",
-        }
-        data = {
-            "model": "gpt-3.5-turbo",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "You are a JSON generator. You only return valid JSON. You generate JSON with information about realistic scientific research papers for a given topic. The fields in the returned JSON object are: journal_name, thanks, author_name, author_organization, author_email, paper_title, paper_abstract",
-                },
-                {
-                    "role": "user",
-                    "content": f"Generate a valid JSON object with metadata about an award-winning research paper related to '{chatgpt_topic}'. Include the journal name, author thanks, author name, author organization, author email, paper title, and paper abstract.",
-                },
-            ],
-        }
-        response = requests.post(url, headers=headers, json=data)
-        metadata = json.loads(response.json()["choices"][0]["message"]["content"])
-        with open(f"{temp_dir}/metadata.json", "w") as f:
-            json.dump(metadata, f)
-        with open(f"{temp_dir}/metadata.md", "w") as f:
-            f.write(
-                f"""---
+import logging
+import concurrent.futures
+
+API_URL = os.environ.get(
+    "PAPERMINT_CHAT_API_URL", "https://api.openai.com/v1/chat/completions"
+)
+METADATA_FIELDS = [
+    "journal_name",
+    "thanks",
+    "author_name",
+    "author_organization",
+    "author_email",
+    "paper_title",
+    "paper_abstract",
+]
+METADATA_TIMEOUT = 30
+_executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="metadata")
+
+
+def metadata_errors():
+    # Raised by network failures and by replies that aren't valid metadata JSON
+    import requests
+
+    return (requests.RequestException, ValueError, KeyError, IndexError, TypeError)
+
+
+def request_metadata(chatgpt_token, chatgpt_topic, api_url=API_URL, timeout=60):
+    import requests
+
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {chatgpt_token}",
+    }
+    data = {
+        "model": "gpt-3.5-turbo",
+        "messages": [
+            {
+                "role": "system",
+                "content": "You are a JSON generator. You only return valid JSON. You generate JSON with information about realistic scientific research papers for a given topic. The fields in the returned JSON object are: journal_name, thanks, author_name, author_organization, author_email, paper_title, paper_abstract",
+            },
+            {
+                "role": "user",
+                "content": f"Generate a valid JSON object with metadata about an award-winning research paper related to '{chatgpt_topic}'. Include the journal name, author thanks, author name, author organization, author email, paper title, and paper abstract.",
+            },
+        ],
+    }
+    response = requests.post(api_url, headers=headers, json=data, timeout=timeout)
+    response.raise_for_status()
+    metadata = json.loads(response.json()["choices"][0]["message"]["content"])
+    missing = [
+        field
+        for field in METADATA_FIELDS
+        if not isinstance(metadata, dict) or not isinstance(metadata.get(field), str)
+    ]
+    if missing:
+        raise ValueError(f"Metadata is missing fields: {', '.join(missing)}")
+    return metadata
+
+
+def write_metadata(temp_dir, metadata):
+    with open(f"{temp_dir}/metadata.json", "w") as f:
+        json.dump(metadata, f)
+    with open(f"{temp_dir}/metadata.md", "w") as f:
+        f.write(
+            f"""---
 documentclass: IEEEtran
 classoption:
   - journal
@@ -53,11 +88,56 @@ abstract: |
 
 
 """
-            )
+        )
+
+
+def fetch_metadata(chatgpt_token, chatgpt_topic, pool=None, timeout=METADATA_TIMEOUT):
+    if not chatgpt_token:
+        return None
+    # The pool serves pre-generated records instantly; only fall back to a
+    # blocking request when it has run dry
+    if pool is not None:
+        metadata = pool.take()
+        if metadata is not None:
+            return metadata
+    try:
+        return request_metadata(chatgpt_token, chatgpt_topic, timeout=timeout)
+    except metadata_errors() as e:
+        logging.error(f"Failed to generate metadata, using the default: {e}")
+        return None
+
+
+def start_metadata(chatgpt_token, chatgpt_topic, pool=None, timeout=METADATA_TIMEOUT):
+    # Runs the request alongside the corpus stages; join with finish_metadata
+    return _executor.submit(fetch_metadata, chatgpt_token, chatgpt_topic, pool, timeout)
+
+
+def finish_metadata(temp_dir, future, timeout=METADATA_TIMEOUT):
+    try:
+        metadata = future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        logging.error(f"Metadata not ready after {timeout}s, using the default")
+        metadata = None
+    if metadata is not None:
+        write_metadata(temp_dir, metadata)
     else:
-        with open(f"{temp_dir}/metadata.md", "w") as f:
-            f.write(
-                """---
+        write_default_metadata(temp_dir)
+
+
+def generate_metadata(
+    temp_dir, chatgpt_token, chatgpt_topic, pool=None, timeout=METADATA_TIMEOUT
+):
+    metadata = fetch_metadata(chatgpt_token, chatgpt_topic, pool, timeout)
+    if metadata is not None:
+        write_metadata(temp_dir, metadata)
+    else:
+        write_default_metadata(temp_dir)
+
+
+def write_default_metadata(temp_dir):
+    with open(f"{temp_dir}/metadata.md", "w") as f:
+        f.write(
+            """---
 documentclass: IEEEtran
 classoption:
   - journal
@@ -94,4 +174,4 @@ abstract: |
 
 
 """
-            )
+        )
@@ -1,5 +1,18 @@
-def dump_latex_template(temp_dir):
-    template = r"""\PassOptionsToPackage{unicode$for(hyperrefoptions)$,$hyperrefoptions$$endfor$}{hyperref}
+import os
+import hashlib
+import threading
+import subprocess
+from mint import runner
+
+FORMATS_DIR = "formats"
+END_OF_DUMP = "\\csname endofdump\\endcsname"
+_format_locks = {}
+_format_locks_lock = threading.Lock()
+
+
+# Written to template.tex by the template stage, whose params carry its hash
+# so that temp dirs built from an older template get it rewritten
+TEMPLATE = r"""\PassOptionsToPackage{unicode$for(hyperrefoptions)$,$hyperrefoptions$$endfor$}{hyperref}
 \PassOptionsToPackage{hyphens}{url}
 $if(colorlinks)$
 \PassOptionsToPackage{dvipsnames,svgnames,x11names}{xcolor}
@@ -141,21 +154,9 @@ $endif$
 \IfFileExists{xurl.sty}{\usepackage{xurl}}{} % add URL line breaks if available
 \IfFileExists{bookmark.sty}{\usepackage{bookmark}}{\usepackage{hyperref}}
 \hypersetup{
-$if(title-meta)$
-  pdftitle={$title-meta$},
-$endif$
-$if(author-meta)$
-  pdfauthor={$author-meta$},
-$endif$
 $if(lang)$
   pdflang={$lang$},
 $endif$
-$if(subject)$
-  pdfsubject={$subject$},
-$endif$
-$if(keywords)$
-  pdfkeywords={$for(keywords)$$keywords$$sep$, $endfor$},
-$endif$
 $if(colorlinks)$
   colorlinks=true,
   linkcolor={$if(linkcolor)$$linkcolor$$else$Maroon$endif$},
@@ -295,6 +296,22 @@ $if(csl-refs)$
 \newcommand{\CSLRightInline}[1]{\parbox[t]{\linewidth - \csllabelwidth}{#1}\break}
 \newcommand{\CSLIndent}[1]{\hspace{\cslhangindent}#1}
 $endif$
+% The precompiled format stops here; what follows depends on the metadata
+\csname endofdump\endcsname
+\hypersetup{
+$if(title-meta)$
+  pdftitle={$title-meta$},
+$endif$
+$if(author-meta)$
+  pdfauthor={$author-meta$},
+$endif$
+$if(subject)$
+  pdfsubject={$subject$},
+$endif$
+$if(keywords)$
+  pdfkeywords={$for(keywords)$$keywords$$sep$, $endfor$},
+$endif$
+}
 $for(header-includes)$
 $header-includes$
 $endfor$
@@ -433,5 +450,89 @@ $include-after$
 
 $endfor$
 \end{document}"""
+TEMPLATE_HASH = hashlib.sha256(TEMPLATE.encode()).hexdigest()
+
+
+def dump_latex_template(temp_dir):
     with open(f"{temp_dir}/template.tex", "w") as f:
-        f.write(template)
+        f.write(TEMPLATE)
+
+
+def dump_format(temp_dir, tex_file):
+    # Dumps the preamble up to \endofdump (or \begin{document}) into a .fmt
+    # with mylatexformat, keyed by a hash of that part. The template puts
+    # \endofdump before anything taken from the paper's metadata, so every
+    # paper built from one template shares a format. Compiles that start from
+    # the format skip loading IEEEtran, hyperref, microtype and friends.
+    # Only the preamble is read, however long the document after it is
+    lines = []
+    with open(tex_file, "r") as f:
+        for line in f:
+            end = line.find(END_OF_DUMP)
+            if end == -1:
+                end = line.find("\\begin{document}")
+            if end != -1:
+                lines.append(line[:end])
+                break
+            lines.append(line)
+        else:
+            return None
+    preamble = "".join(lines)
+    name = f"preamble-{hashlib.sha256(preamble.encode()).hexdigest()[:16]}"
+    formats_dir = os.path.join(temp_dir, FORMATS_DIR)
+    fmt = os.path.join(formats_dir, f"{name}.fmt")
+    failed = os.path.join(formats_dir, f"{name}.failed")
+
+    with _format_locks_lock:
+        lock = _format_locks.setdefault(name, threading.Lock())
+    with lock:
+        if os.path.exists(fmt):
+            os.utime(fmt)  # Compaction keeps the most recently used formats
+            return name
+        if os.path.exists(failed):
+            return None
+        os.makedirs(formats_dir, exist_ok=True)
+        with open(os.path.join(formats_dir, f"{name}.tex"), "w") as f:
+            f.write(preamble + "\\begin{document}\n\\end{document}\n")
+        result = runner.run(
+            [
+                "pdflatex",
+                "-ini",
+                "-interaction=nonstopmode",
+                "-halt-on-error",
+                f"-jobname={name}",
+                f"-output-directory={formats_dir}",
+                "&pdflatex",
+                "mylatexformat.ltx",
+                os.path.join(formats_dir, f"{name}.tex"),
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if result.returncode != 0 or not os.path.exists(fmt):
+            # Not every preamble can be dumped; remember and compile normally
+            open(failed, "w").close()
+            return None
+        return name
+
+
+def pdflatex_command(temp_dir, tex_file, output_dir):
+    # Returns the pdflatex arguments and environment for compiling tex_file,
+    # starting from a precompiled preamble format when one can be dumped
+    # Errors stop the run instead of prompting on a terminal nobody reads
+    args = [
+        "pdflatex",
+        "-interaction=nonstopmode",
+        "-halt-on-error",
+        "-output-directory",
+        output_dir,
+        tex_file,
+    ]
+    name = dump_format(temp_dir, tex_file)
+    if name is None:
+        return args, None
+    env = dict(os.environ)
+    env["TEXFORMATS"] = os.path.join(temp_dir, FORMATS_DIR) + os.pathsep + env.get(
+        "TEXFORMATS", ""
+    )
+    return ["pdflatex", f"-fmt={name}"] + args[1:], env
@@ -0,0 +1,80 @@
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+from mint.generate_metadata import API_URL, metadata_errors, request_metadata
+
+
+class MetadataPool:
+    def __init__(
+        self,
+        pool_dir,
+        chatgpt_token,
+        chatgpt_topic,
+        size=10,
+        low_water=3,
+        api_url=API_URL,
+        timeout=60,
+        max_failures=3,
+    ):
+        slug = re.sub(r"[^a-z0-9]+", "-", chatgpt_topic.lower()).strip("-")
+        self.dir = os.path.join(pool_dir, slug or "default")
+        self.chatgpt_token = chatgpt_token
+        self.chatgpt_topic = chatgpt_topic
+        self.size = size
+        self.low_water = low_water
+        self.api_url = api_url
+        self.timeout = timeout
+        self.max_failures = max_failures
+        self.lock = threading.Lock()
+        self.refilling = None
+        os.makedirs(self.dir, exist_ok=True)
+
+    def records(self):
+        return sorted(f for f in os.listdir(self.dir) if f.endswith(".json"))
+
+    def take(self):
+        metadata = None
+        for name in self.records():
+            path = os.path.join(self.dir, name)
+            claimed = f"{path}.taken"
+            try:
+                # Renaming claims the record, even against other processes
+                os.replace(path, claimed)
+            except FileNotFoundError:
+                continue
+            with open(claimed, "r") as f:
+                metadata = json.load(f)
+            os.remove(claimed)
+            break
+        if len(self.records()) < self.low_water:
+            self.refill_async()
+        return metadata
+
+    def refill(self):
+        failures = 0
+        while len(self.records()) < self.size and failures < self.max_failures:
+            try:
+                metadata = request_metadata(
+                    self.chatgpt_token, self.chatgpt_topic, self.api_url, self.timeout
+                )
+            except metadata_errors() as e:
+                failures += 1
+                logging.error(f"Failed to generate pooled metadata: {e}")
+                continue
+            # Records are named so that listing order is generation order
+            path = os.path.join(self.dir, f"{time.time_ns()}-{uuid.uuid4().hex}.json")
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(metadata, f)
+            os.replace(f"{path}.tmp", path)
+
+    def refill_async(self):
+        with self.lock:
+            if self.refilling is not None and self.refilling.is_alive():
+                return self.refilling
+            self.refilling = threading.Thread(target=self.refill, daemon=True)
+            self.refilling.start()
+            return self.refilling
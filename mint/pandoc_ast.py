@@ -0,0 +1,80 @@
+import os
+import json
+import subprocess
+from mint import runner
+
+# Works on pandoc's JSON AST as plain dicts and lists. Every pandoc call goes
+# through runner.run like the rest of the build, so it is bounded by the same
+# timeout. Inserted figures and equations only ever become top-level blocks,
+# so they can't land inside a list, a table, a code block or the front matter.
+SEPARATOR = "<!-- mint-snippet -->"
+
+
+def _pandoc(args):
+    # pandoc's runtime reserves far more address space than it uses
+    result = runner.run(
+        ["pandoc", *args], memory_limit=None, stdout=subprocess.PIPE, check=True
+    )
+    return result.stdout
+
+
+def read_json(path, from_format="markdown"):
+    return json.loads(_pandoc(["--from", from_format, "--to", "json", path]))
+
+
+def write_json(doc, path):
+    with open(path, "w") as f:
+        json.dump(doc, f)
+
+
+def to_markdown(json_file, markdown_file):
+    # Standalone, so the metadata comes back as a YAML block
+    _pandoc(
+        ["--from", "json", "--to", "markdown", "--standalone"]
+        + ["--output", markdown_file, json_file]
+    )
+
+
+def parse_snippets(temp_dir, snippets):
+    # Parses every snippet in one pandoc call, as the markdown they were
+    # validated as. Returns the blocks of each snippet, in order.
+    if not snippets:
+        return []
+    path = os.path.join(temp_dir, "snippets.md")
+    with open(path, "w") as f:
+        f.write(f"\n\n{SEPARATOR}\n\n".join(snippets))
+    groups = [[]]
+    for block in read_json(path)["blocks"]:
+        if block == {"t": "RawBlock", "c": ["html", SEPARATOR]}:
+            groups.append([])
+        else:
+            groups[-1].append(block)
+    if len(groups) != len(snippets):
+        raise ValueError(f"Parsed {len(groups)} snippets, expected {len(snippets)}")
+    return groups
+
+
+def stringify(node):
+    # The plain text of a block, for matching snippets against it
+    if isinstance(node, list):
+        return " ".join(filter(None, (stringify(child) for child in node)))
+    if not isinstance(node, dict):
+        return ""
+    if node.get("t") == "Str":
+        return node["c"]
+    if node.get("t") in ("Math", "Code", "CodeBlock", "RawInline", "RawBlock"):
+        return node["c"][1]
+    return stringify(node.get("c"))
+
+
+def insert_after(doc, insertions, groups):
+    # insertions is [(block index, number of snippets)], in block order, and
+    # groups the parsed snippets they add, in the same order
+    blocks, groups = [], iter(groups)
+    insertions = dict(insertions)
+    for i, block in enumerate(doc["blocks"]):
+        blocks.append(block)
+        for _ in range(insertions.get(i, 0)):
+            blocks.extend(next(groups))
+    doc["blocks"] = blocks
+    return doc
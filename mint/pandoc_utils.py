@@ -1,120 +1,392 @@
 import os
+import json
+import threading
 import subprocess
 import random
-import chardet
-import requests
+import codecs
+import unicodedata
+import tempfile
 import logging
+import collections
+from mint import (
+    asset_index,
+    corpus_fs,
+    corpus_store,
+    pandoc_ast,
+    profiling,
+    progress,
+    runner,
+)
+from mint.compressed_io import open_text
+from mint.latex_template import pdflatex_command
 
-logging.basicConfig(level=logging.DEBUG)
+# Snippets are matched against this many of the preceding non-blank lines,
+# or blocks in block-aware builds
+CONTEXT_LINES = 4
+# Detection only ever looks at this many bytes, however large the input is
+ENCODING_SAMPLE_SIZE = 64 * 1024
+# Block-aware builds hold the whole JSON AST in memory, several times the size
+# of the input, so inputs over this size stream line by line instead
+MAX_BLOCK_AWARE_SIZE = 16 * 1024 * 1024
+BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+# Every snippet check_latex turns down, with the reason
+REJECTIONS_FILE = "rejected_snippets.jsonl"
+_rejections_lock = threading.Lock()
 
-def detect_encoding(file_path):
+def detect_encoding(file_path, sample_size=ENCODING_SAMPLE_SIZE):
     with open(file_path, 'rb') as f:
-        raw_data = f.read()
-    result = chardet.detect(raw_data)
+        sample = f.read(sample_size)
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        # A multi-byte character cut off at the end of the sample is fine
+        codecs.getincrementaldecoder("utf-8")().decode(
+            sample, final=len(sample) < sample_size
+        )
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    import chardet
+
+    result = chardet.detect(sample)
     return result['encoding']
 
-def read_file_with_encoding(file_path, encoding):
+def decode_error_offset(file_path, encoding, chunk_size=1 << 20):
+    # Roughly where the first byte encoding can't decode is, or None
+    decoder = codecs.getincrementaldecoder(encoding)()
+    offset = 0
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            try:
+                decoder.decode(chunk)
+            except UnicodeDecodeError as e:
+                return offset + e.start
+            offset += len(chunk)
+    try:
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return offset
+    return None
+
+
+def fallback_encodings(file_path, encoding, sample_size=ENCODING_SAMPLE_SIZE):
+    # Detection only saw the start of the file. When that verdict fails
+    # further in, the bytes from the failure on say more about the encoding.
+    # UTF-16 is only tried when the sample has the NUL bytes it would have.
+    # latin1 decodes anything, so it always comes last.
     try:
-        with open(file_path, "r", encoding=encoding) as f:
-            return f.read()
-    except UnicodeDecodeError as e:
-        logging.error(f"Failed to decode file with encoding {encoding}: {e}")
-        return None
-    
-def check_latex(content):
-    dir = os.path.join(temp_dir, "latex_check")
-    os.makedirs(dir, exist_ok=True)
-    with open(os.path.join(dir, "content.md"), "w") as f:
-        f.write(content)
-    subprocess.run(
+        offset = decode_error_offset(file_path, encoding) or 0
+    except LookupError:  # Not an encoding Python knows
+        offset = 0
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        sample = f.read(sample_size)
+    import chardet
+
+    candidates = [chardet.detect(sample)["encoding"]]
+    if b"\x00" in sample:
+        candidates.append("utf-16-le")
+    candidates += ["cp1252", "latin1"]
+    # Aliases such as latin-1 and iso-8859-1 are one codec, and each one
+    # tried costs a full pass over the input
+    try:
+        tried = {codecs.lookup(encoding).name}
+    except LookupError:
+        tried = set()
+    fallbacks = []
+    for candidate in filter(None, candidates):
+        try:
+            name = codecs.lookup(candidate).name
+        except LookupError:
+            continue
+        if name not in tried:
+            tried.add(name)
+            fallbacks.append(name)
+    return fallbacks
+
+def latex_error(log):
+    # pdflatex in nonstopmode reports errors on lines starting with "! "
+    for line in log.splitlines():
+        if line.startswith("! "):
+            return line[2:].strip()
+    return None
+
+
+def reject_snippet(temp_dir, content, reason):
+    profiling.count("snippets_rejected")
+    with _rejections_lock:
+        with open(os.path.join(temp_dir, REJECTIONS_FILE), "a") as f:
+            f.write(json.dumps({"snippet": content, "reason": reason}) + "\n")
+    return False
+
+
+def check_latex(content, temp_dir):
+    # Each check gets its own scratch directory so concurrent checks don't
+    # overwrite each other's files
+    os.makedirs(os.path.join(temp_dir, "latex_check"), exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=os.path.join(temp_dir, "latex_check")) as dir:
+        with open(os.path.join(dir, "content.md"), "w") as f:
+            f.write(content)
+        # pandoc's runtime reserves far more address space than it uses, so
+        # it runs without a memory limit
+        result = runner.run(
+            [
+                "pandoc",
+                "--from",
+                "markdown",
+                "--to",
+                "latex",
+                "--template",
+                os.path.join(temp_dir, "template.tex"),
+                "--output",
+                os.path.join(dir, "out.tex"),
+                os.path.join(dir, "content.md"),
+            ],
+            timeout=runner.SNIPPET_TIMEOUT,
+            memory_limit=None,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if result.timed_out:
+            return reject_snippet(temp_dir, content, "pandoc timed out")
+        if result.returncode != 0:
+            error = result.stderr.decode(errors="replace").strip()
+            return reject_snippet(temp_dir, content, f"pandoc failed: {error}")
+        args, env = pdflatex_command(temp_dir, os.path.join(dir, "out.tex"), dir)
+        result = runner.run(
+            args,
+            timeout=runner.SNIPPET_TIMEOUT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env,
+        )
+        if result.timed_out:
+            return reject_snippet(temp_dir, content, "pdflatex timed out")
+        if result.returncode != 0:
+            log = result.stdout.decode(errors="replace")
+            reason = latex_error(log) or f"pdflatex exited with {result.returncode}"
+            return reject_snippet(temp_dir, content, reason)
+        profiling.count("snippets_accepted")
+        return True
+
+
+def fold_ascii(text):
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+
+def read_lines(file_path):
+    with open_text(file_path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+def write_markdown(input_file, encoding, output_md, metadata_file, insert, ascii_only):
+    # Streams the input line by line so memory stays bounded however long the
+    # document is. Decoding errors surface part way through, so the caller
+    # retries the whole pass with the next encoding.
+    with open(output_md, "w") as out:
+        with open(metadata_file, "r") as f:
+            out.write(f.read())
+        with open(input_file, "r", encoding=encoding) as f:
+            for line in f:
+                line = insert(line.rstrip("\r\n")) + "\n"
+                out.write(fold_ascii(line) if ascii_only else line)
+
+def compile_markdown(
+    temp_dir, markdown_file, output_dir, variables=(), from_format="markdown"
+):
+    # Renders markdown_file (or a JSON AST, with from_format="json") through
+    # the template and compiles it, leaving output.tex and output.pdf in
+    # output_dir
+    tex_file = os.path.join(output_dir, "output.tex")
+    runner.run(
         [
             "pandoc",
             "--from",
-            "markdown",
+            from_format,
             "--to",
             "latex",
             "--template",
-            "template.tex",
+            os.path.join(temp_dir, "template.tex"),
+            *(f"--variable={variable}" for variable in variables),
             "--output",
-            os.path.join(dir, "out.tex"),
-            os.path.join(dir, "content.md"),
+            tex_file,
+            markdown_file,
         ],
+        memory_limit=None,
         check=True,
     )
-    result = subprocess.run(
-        ["pdflatex", "-output-directory", dir, "out.tex"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
+    args, env = pdflatex_command(temp_dir, tex_file, output_dir)
+    runner.run(args, check=True, env=env)
+    return os.path.join(output_dir, "output.pdf")
+
+def insert_between_blocks(temp_dir, markdown_file, random_elements):
+    # Writes output.json: the parsed document with the elements picked after
+    # each top-level block parsed and spliced in after it
+    doc = pandoc_ast.read_json(markdown_file)
+    insertions, elements = [], []
+    for i, block in enumerate(doc["blocks"]):
+        picked = random_elements(pandoc_ast.stringify(block))
+        if picked:
+            insertions.append((i, len(picked)))
+            elements += picked
+    groups = pandoc_ast.parse_snippets(temp_dir, elements)
+    pandoc_ast.write_json(
+        pandoc_ast.insert_after(doc, insertions, groups),
+        os.path.join(temp_dir, "output.json"),
     )
-    return result.returncode == 0
 
 
-def build_paper(input_file, output_file, temp_dir, figure_prob, equation_prob, quiet):
+def build_paper(
+    input_file,
+    output_file,
+    temp_dir,
+    figure_prob,
+    equation_prob,
+    quiet,
+    ascii_only=False,
+    shards=1,
+    postprocess=False,
+    on_progress=None,
+    topical=True,
+    block_aware=True,
+):
     if input_file.startswith("http"):
-        response = requests.get(input_file)
-        with open(os.path.join(temp_dir, "input_file"), "wb") as f:
-            f.write(response.content)
+        import requests
+
+        with requests.get(input_file, stream=True) as response:
+            with open(os.path.join(temp_dir, "input_file"), "wb") as f:
+                for chunk in response.iter_content(1 << 20):
+                    profiling.count("bytes_downloaded", len(chunk))
+                    f.write(chunk)
         input_file = os.path.join(temp_dir, "input_file")
 
+    if block_aware and os.path.getsize(input_file) > MAX_BLOCK_AWARE_SIZE:
+        logging.info(
+            f"{input_file} is over {MAX_BLOCK_AWARE_SIZE} bytes, "
+            "inserting after lines instead of between blocks"
+        )
+        block_aware = False
+
     encoding = detect_encoding(input_file)
-    logging.info(encoding)
     if encoding is None:
         encoding = "utf-8"
     logging.info(f"Detected encoding: {encoding}")
 
-    content = read_file_with_encoding(input_file, encoding)
-    if content is None:
-        # Try reading with other common encodings
-        encodings_to_try = ['utf-16-le', 'latin1', 'iso-8859-1', 'ascii']
-        for enc in encodings_to_try:
-            content = read_file_with_encoding(input_file, enc)
-            if content is not None:
-                break
+    captions = read_lines(os.path.join(temp_dir, "captions.txt"))
+    equations = read_lines(os.path.join(temp_dir, "equations.txt"))
+    # Indexed images are only written out once they are picked
+    images = list(corpus_fs.iter_paths(os.path.join(temp_dir, "images")))
+    images += asset_index.accepted_assets(temp_dir)
+    # What this build used is kept longest when the corpus is over budget
+    used = set()
+    tracker = progress.tracker(on_progress, "build_paper")
+    # With topical set, snippets are drawn from the ones most similar to the
+    # last few lines, falling back to any snippet when none share a word
+    index = None
+    if topical:
+        from mint import snippet_index
 
-    if content is None:
-        raise ValueError(f"Failed to decode file {input_file} with any encoding")
-
-    with open(os.path.join(temp_dir, "metadata.md"), "r") as f:
-        metadata = f.read()
+        index = snippet_index.load_or_build(temp_dir, captions, equations, images)
+    context = collections.deque(maxlen=CONTEXT_LINES)
 
-    # with open(input_file, "r") as f:
-    #     content = f.read()
+    def choose(kind, snippets):
+        if index is not None:
+            matches = index[kind].query(" ".join(context))
+            if matches:
+                profiling.count(f"{kind}_matched")
+                return snippets[random.choice(matches)]
+        return random.choice(snippets)
 
-    def insert_random_elements(line):
+    def random_elements(text):
+        # Markdown for the figure and equation, if any, that go after text
+        tracker.update(1, len(text))
+        if text.strip():
+            context.append(text)
+        elements = []
         if random.randint(1, figure_prob) == 1:
-            with open(os.path.join(temp_dir, "captions.txt"), "r") as f:
-                captions = f.readlines()
-            if captions:
-                line += f"\n\n![{random.choice(captions).strip()}]({random.choice(os.listdir(os.path.join(temp_dir, 'images')))})\n\n"
+            if captions and images:
+                image = choose("images", images)
+                if isinstance(image, dict):
+                    used.add(os.path.join(temp_dir, image["archive"]))
+                    image = asset_index.materialize(temp_dir, image)
+                used.add(image)
+                elements.append(f"![{choose('captions', captions)}]({image})")
         if random.randint(1, equation_prob) == 1:
-            with open(os.path.join(temp_dir, "equations.txt"), "r") as f:
-                equations = f.readlines()
             if equations:
-                line += f"\n\n{random.choice(equations).strip()}\n\n"
-        return line
+                elements.append(f"$${choose('equations', equations)}$$")
+        return elements
 
-    content = "\n".join(insert_random_elements(line) for line in content.splitlines())
+    def insert_random_elements(line):
+        return line + "".join(f"\n\n{e}\n\n" for e in random_elements(line))
 
-    with open(os.path.join(temp_dir, "output.md"), "w") as f:
-        f.write(metadata + content)
+    # Try the detected encoding first. If it fails part way through, the
+    # fallbacks are picked from the bytes where it failed.
+    encodings_to_try = [encoding]
+    # Block-aware builds parse the plain document once and insert between its
+    # top-level blocks; otherwise elements go after raw lines as they stream
+    markdown_file = "document.md" if block_aware else "output.md"
+    markdown_file = os.path.join(temp_dir, markdown_file)
+    for enc in encodings_to_try:
+        try:
+            write_markdown(
+                input_file,
+                enc,
+                markdown_file,
+                os.path.join(temp_dir, "metadata.md"),
+                (lambda line: line) if block_aware else insert_random_elements,
+                ascii_only,
+            )
+            break
+        except (UnicodeDecodeError, LookupError) as e:
+            logging.error(f"Failed to decode file with encoding {enc}: {e}")
+            if enc == encoding:
+                encodings_to_try += fallback_encodings(input_file, enc)
+    else:
+        raise ValueError(f"Failed to decode file {input_file} with any encoding")
+    if block_aware:
+        insert_between_blocks(temp_dir, markdown_file, random_elements)
+    tracker.close()
+    corpus_store.record_usage(temp_dir, used)
 
-    subprocess.run(
-        [
-            "pandoc",
-            "--from",
-            "markdown",
-            "--to",
-            "latex",
-            "--template",
-            os.path.join(temp_dir, "template.tex"),
-            "--output",
-            os.path.join(temp_dir, "output.tex"),
+    if shards > 1:
+        from mint.sharding import build_sharded
+
+        if block_aware:
+            # Sharding splits markdown at top-level headings
+            pandoc_ast.to_markdown(
+                os.path.join(temp_dir, "output.json"),
+                os.path.join(temp_dir, "output.md"),
+            )
+        build_sharded(
+            temp_dir,
             os.path.join(temp_dir, "output.md"),
-        ],
-        check=True,
-    )
-    subprocess.run(
-        ["pdflatex", "-output-directory", temp_dir, "output.tex"], check=True
-    )
+            shards,
+            on_progress=on_progress,
+        )
+    else:
+        # Block-aware builds render LaTeX straight from the AST
+        source, from_format = "output.md", "markdown"
+        if block_aware:
+            source, from_format = "output.json", "json"
+        with progress.tracker(on_progress, "compile", 1) as tracker:
+            compile_markdown(
+                temp_dir,
+                os.path.join(temp_dir, source),
+                temp_dir,
+                from_format=from_format,
+            )
+            tracker.update()
+
+    report = None
+    if postprocess:
+        from mint.pdf_postprocess import postprocess_pdf
+
+        report = postprocess_pdf(os.path.join(temp_dir, "output.pdf"))
 
     os.rename(os.path.join(temp_dir, "output.pdf"), output_file)
+    return report
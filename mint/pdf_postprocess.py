@@ -0,0 +1,131 @@
+import os
+import shutil
+import hashlib
+import logging
+import subprocess
+from mint import profiling, runner
+
+
+def _image_key(image):
+    # Identical images embedded twice have the same encoded stream and the same
+    # stream dictionary apart from /Length
+    h = hashlib.sha256(image._data)
+    for key, value in sorted(image.items()):
+        if key != "/Length":
+            h.update(f"{key}={value!r}\n".encode())
+    return h.hexdigest()
+
+
+def _dedupe_xobjects(resources, seen, orphans, visited):
+    from PyPDF2.generic import IndirectObject, NameObject
+
+    resources = resources.get_object() if resources is not None else None
+    xobjects = resources.get("/XObject") if resources else None
+    if xobjects is None:
+        return
+    xobjects = xobjects.get_object()
+    for name, ref in list(xobjects.items()):
+        if not isinstance(ref, IndirectObject):
+            continue
+        xobject = ref.get_object()
+        if xobject.get("/Subtype") == "/Form":
+            # Form XObjects carry their own resources, possibly with images
+            if ref.idnum not in visited:
+                visited.add(ref.idnum)
+                _dedupe_xobjects(xobject.get("/Resources"), seen, orphans, visited)
+            continue
+        if xobject.get("/Subtype") != "/Image":
+            continue
+        original = seen.setdefault(_image_key(xobject), ref)
+        if original.idnum != ref.idnum:
+            xobjects[NameObject(name)] = original
+            orphans.add(ref.idnum)
+
+
+def optimize_pdf(input_pdf, output_pdf):
+    from PyPDF2 import PdfReader, PdfWriter
+    from PyPDF2.generic import NullObject
+
+    # append brings the outline and named destinations along with the pages;
+    # the document info has to be copied over separately
+    reader = PdfReader(input_pdf)
+    writer = PdfWriter()
+    writer.append(reader)
+    if reader.metadata:
+        writer.add_metadata(reader.metadata)
+
+    seen, orphans, visited = {}, set(), set()
+    for page in writer.pages:
+        _dedupe_xobjects(page.get("/Resources"), seen, orphans, visited)
+        page.compress_content_streams()
+    # The writer serializes every object it copied, referenced or not, so the
+    # replaced duplicates are blanked out to keep their data out of the file
+    for idnum in orphans:
+        writer._objects[idnum - 1] = NullObject()
+
+    with open(output_pdf, "wb") as f:
+        writer.write(f)
+    return len(orphans)
+
+
+def linearize_pdf(input_pdf, output_pdf):
+    qpdf = shutil.which("qpdf")
+    if qpdf is None:
+        logging.info("qpdf is not available, skipping linearization")
+        return False
+    result = runner.run(
+        [
+            qpdf,
+            "--linearize",
+            "--object-streams=generate",
+            "--recompress-flate",
+            input_pdf,
+            output_pdf,
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    if result.timed_out:
+        logging.warning("qpdf timed out, skipping linearization")
+        return False
+    # Exit code 3 means qpdf succeeded with warnings
+    if result.returncode not in (0, 3):
+        logging.warning(f"qpdf failed: {result.stderr.decode(errors='replace')}")
+        return False
+    return True
+
+
+def postprocess_pdf(pdf_file, linearize=True):
+    # Rewrites pdf_file in place and returns what was saved. Each step only
+    # replaces the file when it actually made it smaller, apart from
+    # linearization, which is worth a few bytes for first-page display.
+    size_before = os.path.getsize(pdf_file)
+    optimized = f"{pdf_file}.optimized"
+    images_deduplicated = optimize_pdf(pdf_file, optimized)
+    if os.path.getsize(optimized) < size_before:
+        os.replace(optimized, pdf_file)
+    else:
+        os.remove(optimized)
+
+    linearized = False
+    if linearize:
+        linearized = linearize_pdf(pdf_file, f"{pdf_file}.linearized")
+        if linearized:
+            os.replace(f"{pdf_file}.linearized", pdf_file)
+        elif os.path.exists(f"{pdf_file}.linearized"):
+            os.remove(f"{pdf_file}.linearized")
+
+    size_after = os.path.getsize(pdf_file)
+    profiling.count("pdf_bytes_saved", size_before - size_after)
+    report = {
+        "size_before": size_before,
+        "size_after": size_after,
+        "bytes_saved": size_before - size_after,
+        "images_deduplicated": images_deduplicated,
+        "linearized": linearized,
+    }
+    logging.info(
+        f"Post-processed {pdf_file}: {size_before} -> {size_after} bytes "
+        f"({images_deduplicated} duplicate images, linearized: {linearized})"
+    )
+    return report
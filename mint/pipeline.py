@@ -0,0 +1,172 @@
+from mint.stages import Stage
+
+STAGE_NAMES = [
+    "template",
+    "download",
+    "filter_large_files",
+    "filter_diagrams",
+    "extract_captions",
+    "extract_equations",
+    "stream",
+    "snippet_index",
+]
+
+
+def corpus_stages(
+    temp_dir,
+    arxiv_category,
+    num_papers,
+    max_concurrency,
+    max_size,
+    min_caption_length,
+    min_equation_length,
+    max_equation_length,
+    quiet,
+    stream=False,
+    compress=False,
+    on_progress=None,
+):
+    # Compressed files read back the same, so compress isn't a stage param,
+    # and neither is on_progress, which only observes.
+    # Stage modules pull in arxiv, requests and Pillow, so they are only
+    # imported once a pipeline is actually built
+    from mint import (
+        download_papers,
+        extract_captions,
+        extract_equations,
+        filter_images,
+        latex_template,
+        snippet_index,
+        streaming,
+    )
+
+    stages = [
+        Stage(
+            "template",
+            lambda: latex_template.dump_latex_template(temp_dir),
+            outputs=["template.tex"],
+            params={"template": latex_template.TEMPLATE_HASH},
+        ),
+        Stage(
+            "download",
+            lambda: download_papers.download_papers(
+                temp_dir,
+                arxiv_category,
+                num_papers,
+                max_concurrency,
+                lazy=True,
+                compress=compress,
+                on_progress=on_progress,
+            ),
+            outputs=[
+                "images",
+                "tex",
+                "assets.jsonl",
+                "archives",
+                "download_report.json",
+            ],
+            params={
+                "arxiv_category": arxiv_category,
+                "num_papers": num_papers,
+                "max_member_size": download_papers.MAX_MEMBER_SIZE,
+            },
+        ),
+    ]
+    # Built once per corpus snapshot; build_paper rebuilds it if the corpus
+    # changed since, e.g. after eviction
+    index_stage = Stage(
+        "snippet_index",
+        lambda: snippet_index.index_corpus(temp_dir),
+        inputs=["captions.txt", "equations.txt", "images", "assets.jsonl"],
+        outputs=[snippet_index.INDEX_FILE],
+    )
+    if stream:
+        # Download, filtering and extraction overlap in a single stage
+        return stages[:1] + [
+            Stage(
+                "stream",
+                lambda: streaming.stream_corpus(
+                    temp_dir,
+                    arxiv_category,
+                    num_papers,
+                    max_concurrency,
+                    max_size,
+                    min_caption_length,
+                    min_equation_length,
+                    max_equation_length,
+                    quiet,
+                    compress=compress,
+                    on_progress=on_progress,
+                ),
+                inputs=["template.tex"],
+                outputs=[
+                    "images",
+                    "tex",
+                    "big_images",
+                    "non_diagram_images",
+                    "captions.txt",
+                    "equations.txt",
+                    "download_report.json",
+                ],
+                params={
+                    "arxiv_category": arxiv_category,
+                    "num_papers": num_papers,
+                    "max_size": max_size,
+                    "max_member_size": download_papers.MAX_MEMBER_SIZE,
+                    "min_caption_length": min_caption_length,
+                    "min_equation_length": min_equation_length,
+                    "max_equation_length": max_equation_length,
+                },
+            ),
+            index_stage,
+        ]
+    return stages + [
+        Stage(
+            "filter_large_files",
+            lambda: filter_images.filter_large_files(
+                temp_dir, max_size, on_progress
+            ),
+            inputs=["images", "assets.jsonl"],
+            outputs=["images", "big_images", "assets.jsonl"],
+            params={"max_size": max_size},
+        ),
+        Stage(
+            "filter_diagrams",
+            lambda: filter_images.filter_diagrams(temp_dir, on_progress),
+            inputs=["images", "assets.jsonl"],
+            outputs=["images", "non_diagram_images", "assets.jsonl"],
+        ),
+        Stage(
+            "extract_captions",
+            lambda: extract_captions.extract_captions(
+                temp_dir,
+                min_caption_length,
+                max_concurrency,
+                quiet,
+                compress,
+                on_progress,
+            ),
+            inputs=["tex", "template.tex"],
+            outputs=["captions.txt"],
+            params={"min_caption_length": min_caption_length},
+        ),
+        Stage(
+            "extract_equations",
+            lambda: extract_equations.extract_equations(
+                temp_dir,
+                min_equation_length,
+                max_equation_length,
+                max_concurrency,
+                quiet,
+                compress,
+                on_progress,
+            ),
+            inputs=["tex", "template.tex"],
+            outputs=["equations.txt"],
+            params={
+                "min_equation_length": min_equation_length,
+                "max_equation_length": max_equation_length,
+            },
+        ),
+        index_stage,
+    ]
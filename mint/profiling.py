@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import cProfile
+import threading
+import contextlib
+
+_profiler = None
+
+
+class Profiler:
+    def __init__(self, profile_dir=None):
+        self.profile_dir = profile_dir
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.subprocesses = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        profile = None
+        if self.profile_dir:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # another profiler is active in this thread
+                profile = None
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            # CPU time is process-wide, so it includes worker threads and any
+            # stages running in parallel with this one
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            with self.lock:
+                stage = self.stages.setdefault(
+                    name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0}
+                )
+                stage["calls"] += 1
+                stage["wall_s"] += wall
+                stage["cpu_s"] += cpu
+            if profile is not None:
+                profile.disable()
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profile.dump_stats(os.path.join(self.profile_dir, f"{name}.prof"))
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_subprocess(self, command, elapsed, returncode):
+        with self.lock:
+            proc = self.subprocesses.setdefault(
+                command, {"calls": 0, "failures": 0, "wall_s": 0.0}
+            )
+            proc["calls"] += 1
+            proc["failures"] += returncode != 0
+            proc["wall_s"] += elapsed
+
+    def report(self):
+        with self.lock:
+            return {
+                "wall_s": time.perf_counter() - self.started,
+                "stages": {k: dict(v) for k, v in self.stages.items()},
+                "subprocesses": {k: dict(v) for k, v in self.subprocesses.items()},
+                "counters": dict(self.counters),
+            }
+
+
+def enable(profile_dir=None):
+    global _profiler
+    _profiler = Profiler(profile_dir)
+    return _profiler
+
+
+def disable():
+    global _profiler
+    _profiler = None
+
+
+def report():
+    return _profiler.report() if _profiler else None
+
+
+def write_report(path):
+    with open(path, "w") as f:
+        json.dump(report(), f, indent=2)
+
+
+def stage(name):
+    return _profiler.stage(name) if _profiler else contextlib.nullcontext()
+
+
+def count(name, n=1):
+    if _profiler:
+        _profiler.count(name, n)
+
+
+def record_subprocess(command, elapsed, returncode):
+    if _profiler:
+        _profiler.record_subprocess(command, elapsed, returncode)
@@ -0,0 +1,182 @@
+import sys
+import json
+import time
+import threading
+
+# Stages report progress through an optional on_progress callable, which
+# receives event dicts like
+#   {"stage": "download", "done": 40, "total": 100, "bytes": 52428800,
+#    "elapsed_s": 12.5, "items_per_s": 3.2, "bytes_per_s": 4194304.0,
+#    "eta_s": 18.7, "finished": False}
+# Events are throttled per stage, so updating per item costs a lock and a
+# clock read. total is None while it isn't known yet.
+INTERVAL = 0.5
+
+
+class Progress:
+    def __init__(self, on_progress, stage, total=None, interval=INTERVAL):
+        self.on_progress = on_progress
+        self.stage = stage
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.last = None
+        self.lock = threading.Lock()
+
+    def add_total(self, n):
+        # For stages that only learn their size as they go
+        with self.lock:
+            self.total = (self.total or 0) + n
+        self._maybe_emit()
+
+    def update(self, n=1, nbytes=0):
+        with self.lock:
+            self.done += n
+            self.bytes += nbytes
+        self._maybe_emit()
+
+    def close(self):
+        self._emit(time.monotonic(), finished=True)
+
+    def _maybe_emit(self):
+        now = time.monotonic()
+        if self.last is None or now - self.last >= self.interval:
+            self._emit(now)
+
+    def _emit(self, now, finished=False):
+        with self.lock:
+            self.last = now
+            elapsed = now - self.started
+            items_per_s = self.done / elapsed if elapsed else None
+            eta = None
+            if items_per_s and self.total is not None:
+                eta = max(0.0, (self.total - self.done) / items_per_s)
+            event = {
+                "stage": self.stage,
+                "done": self.done,
+                "total": self.total,
+                "bytes": self.bytes,
+                "elapsed_s": elapsed,
+                "items_per_s": items_per_s,
+                "bytes_per_s": self.bytes / elapsed if elapsed else None,
+                "eta_s": eta,
+                "finished": finished,
+            }
+        self.on_progress(event)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NullProgress:
+    def add_total(self, n):
+        pass
+
+    def update(self, n=1, nbytes=0):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def tracker(on_progress, stage, total=None):
+    if on_progress is None:
+        return NullProgress()
+    return Progress(on_progress, stage, total)
+
+
+def combine(*sinks):
+    sinks = [sink for sink in sinks if sink is not None]
+    if not sinks:
+        return None
+
+    def on_progress(event):
+        for sink in sinks:
+            sink(event)
+
+    return on_progress
+
+
+def _format_bytes(n):
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+def format_event(event):
+    parts = [f"[{event['stage']}]"]
+    if event["total"]:
+        percent = 100 * event["done"] // event["total"]
+        parts.append(f"{event['done']}/{event['total']} ({percent}%)")
+    else:
+        parts.append(str(event["done"]))
+    if event["items_per_s"]:
+        parts.append(f"{event['items_per_s']:.1f}/s")
+    if event["bytes"]:
+        parts.append(_format_bytes(event["bytes"]))
+    if event["bytes_per_s"]:
+        parts.append(f"{_format_bytes(event['bytes_per_s'])}/s")
+    if event["eta_s"] is not None and not event["finished"]:
+        parts.append(f"ETA {event['eta_s']:.0f}s")
+    return " ".join(parts)
+
+
+def cli_sink(stream=sys.stderr):
+    # One line per stage, redrawn in place while the stage is the latest to
+    # report; when stages interleave each gets a fresh line
+    lock = threading.Lock()
+    state = {"stage": None}
+
+    def on_progress(event):
+        with lock:
+            if state["stage"] not in (None, event["stage"]):
+                stream.write("\n")
+            stream.write("\r\033[K" + format_event(event))
+            if event["finished"]:
+                stream.write("\n")
+                state["stage"] = None
+            else:
+                state["stage"] = event["stage"]
+            stream.flush()
+
+    return on_progress
+
+
+def json_lines_sink(path):
+    lock = threading.Lock()
+
+    def on_progress(event):
+        line = json.dumps({"time": time.time(), **event})
+        with lock, open(path, "a") as f:
+            f.write(line + "\n")
+
+    return on_progress
+
+
+class LatestEvents:
+    # Keeps the last event of each stage, for UIs that poll from another
+    # thread (Streamlit can't be updated from the pipeline's threads)
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = {}
+
+    def __call__(self, event):
+        with self.lock:
+            self.events[event["stage"]] = event
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.events)
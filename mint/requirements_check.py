@@ -1,17 +1,66 @@
+import os
+import json
+import shutil
+import hashlib
 import subprocess
+import concurrent.futures
 
+REQUIRED_COMMANDS = ["pandoc", "curl", "python3", "pdflatex", "iconv"]
+CACHE_FILE = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "papermint",
+    "requirements.json",
+)
 
-def check_requirements():
-    required_commands = ["pandoc", "curl", "python3", "pdflatex", "iconv"]
-    for command in required_commands:
-        try:
-            subprocess.run(
-                [command, "--version"],
-                check=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-        except FileNotFoundError:
+
+def cache_key(paths):
+    # The probes only need rerunning when PATH changes or a binary is replaced
+    h = hashlib.sha256(os.environ.get("PATH", "").encode())
+    for command, path in sorted(paths.items()):
+        h.update(f"{command}\0{path}\0{os.stat(path).st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def probe(path):
+    result = subprocess.run(
+        [path, "--version"],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    output = (result.stdout or result.stderr).decode(errors="replace").strip()
+    return output.splitlines()[0] if output else ""
+
+
+def check_requirements(cache_file=CACHE_FILE):
+    paths = {command: shutil.which(command) for command in REQUIRED_COMMANDS}
+    for command, path in paths.items():
+        if path is None:
             raise Exception(
                 f"{command} must be installed and on the PATH for this app to run."
             )
+
+    key = cache_key(paths)
+    try:
+        with open(cache_file, "r") as f:
+            cached = json.load(f)
+        if cached.get("key") == key:
+            return cached["tools"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(paths)) as executor:
+        versions = dict(zip(paths, executor.map(probe, paths.values())))
+    tools = {
+        command: {"path": path, "version": versions[command]}
+        for command, path in paths.items()
+    }
+
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(f"{cache_file}.tmp", "w") as f:
+            json.dump({"key": key, "tools": tools}, f, indent=2)
+        os.replace(f"{cache_file}.tmp", cache_file)
+    except OSError:
+        pass  # A read-only cache only costs the probes on the next run
+    return tools
@@ -0,0 +1,82 @@
+import os
+import time
+import signal
+import subprocess
+from mint import profiling
+
+try:
+    import resource
+except ImportError:  # Not on Windows; limits are skipped there
+    resource = None
+
+# Every pandoc, pdflatex and qpdf call goes through run(), so a document that
+# loops or waits for terminal input costs at most its timeout. Each command
+# runs in its own session and the whole process group is killed on timeout.
+SNIPPET_TIMEOUT = 30
+COMPILE_TIMEOUT = 600
+MEMORY_LIMIT = 2 * 1024**3
+
+
+def _set_limits(pid, memory_limit, cpu_limit):
+    # Applied right after the process starts; preexec_fn would do it earlier
+    # but isn't safe with the thread pools these commands run from
+    if resource is None or not hasattr(resource, "prlimit"):
+        return
+    try:
+        if memory_limit:
+            resource.prlimit(pid, resource.RLIMIT_AS, (memory_limit, memory_limit))
+        if cpu_limit:
+            cpu_limit = int(cpu_limit) + 1
+            resource.prlimit(pid, resource.RLIMIT_CPU, (cpu_limit, cpu_limit))
+    except (ProcessLookupError, PermissionError, ValueError):
+        pass  # Exited already, or the limit is above the hard limit
+
+
+def _kill_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def run(
+    args,
+    timeout=COMPILE_TIMEOUT,
+    memory_limit=MEMORY_LIMIT,
+    cpu_limit=None,
+    check=False,
+    **kwargs,
+):
+    # Like subprocess.run, with stdin closed by default. The result has a
+    # timed_out attribute; with check, a timeout raises TimeoutExpired.
+    kwargs.setdefault("stdin", subprocess.DEVNULL)
+    start = time.perf_counter()
+    timed_out = False
+    proc = subprocess.Popen(args, start_new_session=True, **kwargs)
+    try:
+        _set_limits(proc.pid, memory_limit, cpu_limit or timeout)
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            _kill_group(proc.pid)
+            stdout, stderr = proc.communicate()
+    finally:
+        # Nothing the command started outlives it
+        _kill_group(proc.pid)
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        elapsed = time.perf_counter() - start
+        name = os.path.basename(args[0])
+        profiling.record_subprocess(name, elapsed, proc.returncode)
+        if timed_out:
+            profiling.count(f"{name}_timeouts")
+
+    result = subprocess.CompletedProcess(args, proc.returncode, stdout, stderr)
+    result.timed_out = timed_out
+    if check and timed_out:
+        raise subprocess.TimeoutExpired(args, timeout, stdout, stderr)
+    if check:
+        result.check_returncode()
+    return result
@@ -0,0 +1,131 @@
+import os
+import concurrent.futures
+from mint import progress
+from mint.pandoc_utils import compile_markdown
+
+# Front matter repeated on every shard; the title block only goes on the first
+SHARED_METADATA_KEYS = {"documentclass", "classoption", "journal"}
+
+
+def split_front_matter(lines):
+    if lines and lines[0].rstrip() == "---":
+        for i in range(1, len(lines)):
+            if lines[i].rstrip() in ("---", "..."):
+                return lines[: i + 1], lines[i + 1 :]
+    return [], lines
+
+
+def shared_front_matter(front_matter):
+    if not front_matter:
+        return []
+    kept, keep = [], False
+    for line in front_matter[1:-1]:
+        if line.strip() and not line[0].isspace():
+            keep = line.split(":", 1)[0].strip() in SHARED_METADATA_KEYS
+        if keep:
+            kept.append(line)
+    return [front_matter[0], *kept, front_matter[-1]]
+
+
+def split_sections(lines):
+    # Splits before every top-level heading that isn't inside a code fence
+    sections, current, fence = [], [], None
+    for line in lines:
+        stripped = line.lstrip()
+        if fence:
+            if stripped.startswith(fence):
+                fence = None
+        elif stripped.startswith(("```", "~~~")):
+            fence = stripped[:3]
+        elif line.startswith("# ") and current:
+            sections.append(current)
+            current = []
+        current.append(line)
+    if current:
+        sections.append(current)
+    return sections
+
+
+def group_sections(sections, shards):
+    # Contiguous runs of sections of roughly equal size
+    target = sum(len(line) for section in sections for line in section) / shards
+    groups, size = [[]], 0
+    for section in sections:
+        n = sum(len(line) for line in section)
+        if groups[-1] and size + n / 2 > target and len(groups) < shards:
+            groups.append([])
+            size = 0
+        groups[-1].extend(section)
+        size += n
+    return groups
+
+
+def count_figures(lines):
+    return sum(line.lstrip().startswith("![") for line in lines)
+
+
+def build_sharded(temp_dir, markdown_file, shards, max_workers=None, on_progress=None):
+    from PyPDF2 import PdfReader, PdfWriter
+
+    with open(markdown_file, "r") as f:
+        front_matter, body = split_front_matter(f.readlines())
+    groups = group_sections(split_sections(body), shards)
+    if len(groups) == 1:
+        with progress.tracker(on_progress, "compile", 1) as tracker:
+            output = compile_markdown(temp_dir, markdown_file, temp_dir)
+            tracker.update()
+        return output
+
+    shared = shared_front_matter(front_matter)
+    shard_dirs, figures_before, figures = [], [], 0
+    for i, group in enumerate(groups):
+        shard_dir = os.path.join(temp_dir, "shards", str(i))
+        os.makedirs(shard_dir, exist_ok=True)
+        with open(os.path.join(shard_dir, "output.md"), "w") as f:
+            f.writelines((front_matter if i == 0 else shared) + ["\n"] + group)
+        shard_dirs.append(shard_dir)
+        figures_before.append(figures)
+        figures += count_figures(group)
+
+    # Every shard compiles once, then all but the first once more
+    tracker = progress.tracker(on_progress, "compile", 2 * len(groups) - 1)
+
+    def compile_shard(i, first_page):
+        variables = []
+        if i:
+            variables.append(
+                f"include-before=\\setcounter{{page}}{{{first_page}}}"
+                f"\\setcounter{{figure}}{{{figures_before[i]}}}"
+            )
+        pdf = compile_markdown(
+            temp_dir, os.path.join(shard_dirs[i], "output.md"), shard_dirs[i], variables
+        )
+        tracker.update()
+        return pdf
+
+    # pdflatex is single-threaded, so each shard runs as its own process
+    with tracker, concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_workers or len(groups)
+    ) as executor:
+        pdfs = list(executor.map(lambda i: compile_shard(i, 1), range(len(groups))))
+        # Page counts are only known once every shard has compiled, so the
+        # later shards are compiled again starting from their real page number
+        first_pages = [1]
+        for pdf in pdfs[:-1]:
+            first_pages.append(first_pages[-1] + len(PdfReader(pdf).pages))
+        pdfs[1:] = executor.map(
+            lambda i: compile_shard(i, first_pages[i]), range(1, len(groups))
+        )
+
+    writer = PdfWriter()
+    for pdf in pdfs:
+        writer.append(pdf)
+    # append only brings pages, outlines and destinations; every shard has
+    # the same metadata, so the document info comes from the first
+    metadata = PdfReader(pdfs[0]).metadata
+    if metadata:
+        writer.add_metadata(metadata)
+    output = os.path.join(temp_dir, "output.pdf")
+    with open(output, "wb") as f:
+        writer.write(f)
+    return output
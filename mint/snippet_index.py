@@ -0,0 +1,202 @@
+import os
+import re
+import math
+import hashlib
+import logging
+import collections
+import numpy as np
+from mint import asset_index, corpus_fs, profiling
+from mint.pandoc_utils import read_lines
+
+# TF-IDF vectors over the validated snippets, so build_paper can pick a
+# caption, equation or image that shares words with the paragraph it goes
+# after. Each kind is stored term-major: the rows of a CSR matrix are the
+# sorted vocabulary, so a query only touches the postings of its own terms.
+# Indexed images carry the caption of the figure they appeared in, recorded
+# at download time, or else only the name they had in their paper. Extracted
+# images are renamed, so only indexed assets ever match.
+INDEX_FILE = "snippet_index.npz"
+KINDS = ["captions", "equations", "images"]
+TOP_K = 8
+STOP_WORDS = frozenset(
+    "the and for with that this from are was were its has have been which "
+    "not but can all our their these those into over under between when "
+    "where than then there also each such using used use one two fig figure "
+    "figs figures img imgs image images graphics pics plot plots "
+    "png jpg jpeg eps pdf begin end left right".split()
+)
+TOKEN = re.compile(r"[a-z][a-z0-9]+")
+
+
+def tokenize(text):
+    # TeX macro names come out as words too, so \alpha matches "alpha"
+    return [
+        token
+        for token in TOKEN.findall(text.lower().replace("_", " "))
+        if token not in STOP_WORDS
+    ]
+
+
+def image_key(image):
+    return image["sha256"] if isinstance(image, dict) else image
+
+
+def image_text(image):
+    if not isinstance(image, dict):
+        return ""
+    if image.get("text"):
+        return image["text"]
+    return os.path.splitext(image["member"])[0].replace("/", " ")
+
+
+def digest(keys):
+    h = hashlib.sha1()
+    for key in keys:
+        h.update(key.encode(errors="replace") + b"\0")
+    return h.hexdigest()
+
+
+class TfidfIndex:
+    def __init__(self, terms, idf, indptr, indices, data, size, key_digest):
+        self.terms = terms
+        self.idf = idf
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.size = size
+        self.digest = key_digest
+
+    @classmethod
+    def build(cls, texts, key_digest):
+        counts = [collections.Counter(tokenize(text)) for text in texts]
+        df = collections.Counter(term for c in counts for term in c)
+        terms = sorted(df)
+        ids = {term: i for i, term in enumerate(terms)}
+        idf = np.array(
+            [math.log((1 + len(texts)) / (1 + df[term])) + 1 for term in terms],
+            dtype=np.float32,
+        )
+        postings = [[] for _ in terms]
+        for doc, c in enumerate(counts):
+            weights = {
+                ids[term]: (1 + math.log(n)) * idf[ids[term]] for term, n in c.items()
+            }
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term, w in weights.items():
+                postings[term].append((doc, w / norm))
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(p) for p in postings])
+        flat = [entry for p in postings for entry in p]
+        indices = np.array([doc for doc, _ in flat], dtype=np.int32)
+        data = np.array([w for _, w in flat], dtype=np.float32)
+        terms = np.array(terms, dtype=str)
+        return cls(terms, idf, indptr, indices, data, len(texts), key_digest)
+
+    def query(self, text, k=TOP_K):
+        # Ids of the k most similar snippets, best first; only snippets that
+        # share at least one term with text
+        if not self.size or not len(self.terms):
+            return []
+        c = collections.Counter(tokenize(text))
+        if not c:
+            return []
+        words = np.array(list(c), dtype=str)
+        rows = np.searchsorted(self.terms, words)
+        rows[rows == len(self.terms)] = 0
+        found = self.terms[rows] == words
+        rows = rows[found]
+        if not len(rows):
+            return []
+        tf = np.array(list(c.values()), dtype=np.float32)[found]
+        weights = (1 + np.log(tf)) * self.idf[rows]
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        lengths = ends - starts
+        # Positions of every posting of every query term, without a loop
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions += np.arange(lengths.sum())
+        scores = np.zeros(self.size, dtype=np.float32)
+        contributions = self.data[positions] * np.repeat(weights, lengths)
+        np.add.at(scores, self.indices[positions], contributions)
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        return hits[np.argsort(-scores[hits])].tolist()
+
+
+def build_index(captions, equations, images):
+    return {
+        "captions": TfidfIndex.build(captions, digest(captions)),
+        "equations": TfidfIndex.build(equations, digest(equations)),
+        "images": TfidfIndex.build(
+            [image_text(image) for image in images],
+            digest(image_key(image) for image in images),
+        ),
+    }
+
+
+def save_index(temp_dir, index):
+    arrays = {}
+    for kind, kind_index in index.items():
+        arrays[f"{kind}/terms"] = kind_index.terms
+        arrays[f"{kind}/idf"] = kind_index.idf
+        arrays[f"{kind}/indptr"] = kind_index.indptr
+        arrays[f"{kind}/indices"] = kind_index.indices
+        arrays[f"{kind}/data"] = kind_index.data
+        arrays[f"{kind}/size"] = np.array(kind_index.size)
+        arrays[f"{kind}/digest"] = np.array(kind_index.digest)
+    path = os.path.join(temp_dir, INDEX_FILE)
+    with open(f"{path}.tmp", "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_index(temp_dir):
+    try:
+        with np.load(os.path.join(temp_dir, INDEX_FILE)) as arrays:
+            return {
+                kind: TfidfIndex(
+                    arrays[f"{kind}/terms"],
+                    arrays[f"{kind}/idf"],
+                    arrays[f"{kind}/indptr"],
+                    arrays[f"{kind}/indices"],
+                    arrays[f"{kind}/data"],
+                    int(arrays[f"{kind}/size"]),
+                    str(arrays[f"{kind}/digest"]),
+                )
+                for kind in KINDS
+            }
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+
+
+def corpus_snippets(temp_dir):
+    # The same lists, in the same order, that build_paper draws from
+    captions = read_lines(os.path.join(temp_dir, "captions.txt"))
+    equations = read_lines(os.path.join(temp_dir, "equations.txt"))
+    images = list(corpus_fs.iter_paths(os.path.join(temp_dir, "images")))
+    images += asset_index.accepted_assets(temp_dir)
+    return captions, equations, images
+
+
+def index_corpus(temp_dir):
+    index = build_index(*corpus_snippets(temp_dir))
+    save_index(temp_dir, index)
+    return index
+
+
+def load_or_build(temp_dir, captions, equations, images):
+    # The stored index is only used if it was built from exactly these
+    # snippets; the corpus may have been filtered or evicted since
+    index = load_index(temp_dir)
+    expected = {
+        "captions": digest(captions),
+        "equations": digest(equations),
+        "images": digest(image_key(image) for image in images),
+    }
+    if index and all(index[kind].digest == expected[kind] for kind in KINDS):
+        return index
+    logging.info("Snippet index is missing or stale, rebuilding it")
+    with profiling.stage("snippet_index"):
+        index = build_index(captions, equations, images)
+    save_index(temp_dir, index)
+    return index
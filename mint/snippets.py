@@ -0,0 +1,93 @@
+import re
+import hashlib
+import threading
+import concurrent.futures
+from mint import profiling, progress
+
+# Snippets that only differ in runs of spaces, spaces TeX ignores or an alias
+# spelling of a macro compile the same way, so each canonical form is only
+# sent to check_latex once. The verdict is applied to the original snippets,
+# so only rewrites that keep a snippet's meaning are allowed: comments, ties,
+# line breaks and escaped spaces are left alone.
+MACRO_ALIASES = {
+    r"\le": r"\leq",
+    r"\ge": r"\geq",
+    r"\ne": r"\neq",
+    r"\to": r"\rightarrow",
+    r"\gets": r"\leftarrow",
+    r"\land": r"\wedge",
+    r"\lor": r"\vee",
+    r"\lnot": r"\neg",
+}
+
+# A backslash right before a control word makes it \\ and text instead
+CONTROL_WORD = re.compile(r"(?<!\\)\\[A-Za-z]+")
+# Spaces after a control word are skipped by TeX; "\ " is a space of its own
+MACRO_SPACE = re.compile(r"((?<!\\)\\[A-Za-z]+)[ \t]+(?=[{\[])")
+BRACE_SPACE = re.compile(r"(?<=\{)[ \t]+|(?<![\\ \t])[ \t]+(?=\})")
+# Spaces before a line break are a markdown hard break, so they stay
+SPACES = re.compile(r"(?<![\\ \t])[ \t]+(?![ \t\n])")
+
+
+def canonicalize(snippet):
+    snippet = CONTROL_WORD.sub(
+        lambda m: MACRO_ALIASES.get(m.group(), m.group()), snippet
+    )
+    snippet = SPACES.sub(" ", snippet)
+    snippet = MACRO_SPACE.sub(r"\1", snippet)
+    snippet = BRACE_SPACE.sub("", snippet)
+    return snippet.strip()
+
+
+def snippet_key(snippet):
+    return hashlib.sha1(canonicalize(snippet).encode()).hexdigest()
+
+
+def validate_snippets(snippets, check, max_workers=None, tracker=None):
+    # Checks the first snippet of each canonical form and applies the verdict
+    # to every snippet with that form, keeping their order and repeats
+    keys = [snippet_key(snippet) for snippet in snippets]
+    representatives = {}
+    for key, snippet in zip(keys, snippets):
+        representatives.setdefault(key, snippet)
+    profiling.count("snippets_deduplicated", len(snippets) - len(representatives))
+    tracker = tracker or progress.NullProgress()
+    tracker.add_total(len(representatives))
+
+    def tracked_check(snippet):
+        verdict = check(snippet)
+        tracker.update(1, len(snippet))
+        return verdict
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        verdicts = dict(
+            zip(representatives, executor.map(tracked_check, representatives.values()))
+        )
+    return [snippet for key, snippet in zip(keys, snippets) if verdicts[key]]
+
+
+class SnippetValidator:
+    # The same, for snippets that arrive one at a time from several threads.
+    # A snippet whose form is already being checked waits for that verdict.
+    def __init__(self, check):
+        self.check = check
+        self.lock = threading.Lock()
+        self.verdicts = {}
+
+    def __call__(self, snippet):
+        key = snippet_key(snippet)
+        with self.lock:
+            future = self.verdicts.get(key)
+            owner = future is None
+            if owner:
+                future = self.verdicts[key] = concurrent.futures.Future()
+        if not owner:
+            profiling.count("snippets_deduplicated")
+            return future.result()
+        try:
+            verdict = self.check(snippet)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(verdict)
+        return verdict
@@ -0,0 +1,223 @@
+import os
+import json
+import hashlib
+import contextlib
+import concurrent.futures
+from mint import profiling
+
+STATE_FILE = "stages.json"
+
+
+class Stage:
+    def __init__(self, name, func, inputs=(), outputs=(), params=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+
+
+def _resolve(temp_dir, path):
+    return path if os.path.isabs(path) else os.path.join(temp_dir, path)
+
+
+def _hash_file(path, h):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+
+
+def fingerprint(paths):
+    # Files are hashed by content. Directories can hold hundreds of thousands of
+    # files, so they are fingerprinted by the name, size and mtime of each entry.
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(path.encode())
+        if os.path.isfile(path):
+            h.update(b"f")
+            _hash_file(path, h)
+        elif os.path.isdir(path):
+            h.update(b"d")
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for file in sorted(files):
+                    st = os.stat(os.path.join(root, file))
+                    rel = os.path.relpath(os.path.join(root, file), path)
+                    h.update(f"{rel}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+        else:
+            h.update(b"missing")
+    return h.hexdigest()
+
+
+def fingerprint_params(params):
+    return hashlib.sha256(
+        json.dumps(params, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def dependencies(stages):
+    # A stage depends on every earlier stage that writes one of the paths it
+    # reads or writes, or that reads one of the paths it writes.
+    deps = {}
+    for i, stage in enumerate(stages):
+        reads, writes = set(stage.inputs), set(stage.outputs)
+        deps[stage.name] = {
+            other.name
+            for other in stages[:i]
+            if set(other.outputs) & (reads | writes) or set(other.inputs) & writes
+        }
+    return deps
+
+
+def load_state(temp_dir):
+    try:
+        with open(os.path.join(temp_dir, STATE_FILE), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(temp_dir, state):
+    path = os.path.join(temp_dir, STATE_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def _run_stage(temp_dir, stage, record, force):
+    inputs = [_resolve(temp_dir, p) for p in stage.inputs]
+    outputs = [_resolve(temp_dir, p) for p in stage.outputs]
+    params = fingerprint_params(stage.params)
+    if (
+        not force
+        and record is not None
+        and stage.outputs
+        and record.get("params") == params
+        and record.get("inputs") == fingerprint(inputs)
+        and record.get("outputs") == fingerprint(outputs)
+    ):
+        return "up-to-date", record
+    with profiling.stage(stage.name):
+        stage.func()
+    # Record the state after running so in-place stages (which rewrite their
+    # own inputs) are considered up to date on the next run.
+    return "ran", {
+        "params": params,
+        "inputs": fingerprint(inputs),
+        "outputs": fingerprint(outputs),
+        "input_paths": stage.inputs,
+        "output_paths": stage.outputs,
+    }
+
+
+def _fingerprints(temp_dir, record):
+    return (
+        fingerprint([_resolve(temp_dir, p) for p in record["input_paths"]]),
+        fingerprint([_resolve(temp_dir, p) for p in record["output_paths"]]),
+    )
+
+
+@contextlib.contextmanager
+def preserve_state(temp_dir):
+    # For deliberate changes to stage files, such as evicting old corpus
+    # files: stages that were up to date before are still up to date after
+    state = load_state(temp_dir)
+    current = [
+        name
+        for name, record in state.items()
+        if "input_paths" in record
+        and _fingerprints(temp_dir, record) == (record["inputs"], record["outputs"])
+    ]
+    yield
+    state = load_state(temp_dir)
+    for name in current:
+        if name not in state:
+            continue
+        state[name]["inputs"], state[name]["outputs"] = _fingerprints(
+            temp_dir, state[name]
+        )
+    save_state(temp_dir, state)
+
+
+def _refresh_upstream(temp_dir, state, results, stage):
+    # In-place stages rewrite paths that earlier stages produced or read, e.g.
+    # the filters move files out of the download stage's images/. Stages that
+    # finished earlier in this run and share one of those paths are re-recorded
+    # against the new contents, so they stay up to date on the next run.
+    written = set(stage.outputs)
+    for name, status in results.items():
+        record = state.get(name)
+        if status not in ("ran", "up-to-date") or not record:
+            continue
+        if "input_paths" not in record:
+            continue
+        if written & (set(record["input_paths"]) | set(record["output_paths"])):
+            record["inputs"], record["outputs"] = _fingerprints(temp_dir, record)
+
+
+def run_stages(
+    temp_dir,
+    stages,
+    max_workers=None,
+    force=(),
+    skip=(),
+    callback=None,
+    cancel=None,
+):
+    # Setting the cancel event stops new stages from starting; the ones
+    # already running finish first
+    os.makedirs(temp_dir, exist_ok=True)
+    deps = dependencies(stages)
+    state = load_state(temp_dir)
+    results = {}
+    errors = []
+    pending = {stage.name: stage for stage in stages}
+    stages_by_name = dict(pending)
+    running = {}
+
+    def finish(name, status):
+        results[name] = status
+        if callback:
+            callback(name, status)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if not deps[name] <= results.keys():
+                    continue
+                del pending[name]
+                if cancel is not None and cancel.is_set():
+                    finish(name, "cancelled")
+                elif any(results[d] in ("failed", "blocked") for d in deps[name]):
+                    finish(name, "blocked")
+                elif name in skip:
+                    finish(name, "skipped")
+                else:
+                    if callback:
+                        callback(name, "running")
+                    future = executor.submit(
+                        _run_stage, temp_dir, stage, state.get(name), name in force
+                    )
+                    running[future] = name
+            if not running:
+                continue
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                name = running.pop(future)
+                try:
+                    status, record = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    finish(name, "failed")
+                    continue
+                state[name] = record
+                if status == "ran":
+                    _refresh_upstream(temp_dir, state, results, stages_by_name[name])
+                save_state(temp_dir, state)
+                finish(name, status)
+
+    if errors:
+        raise errors[0]
+    return results
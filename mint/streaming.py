@@ -0,0 +1,149 @@
+import os
+import queue
+import threading
+from mint import progress
+from mint.compressed_io import open_text, open_write
+from mint.download_papers import download_papers
+from mint.extract_captions import find_captions
+from mint.extract_equations import find_equations
+from mint.filter_images import filter_image
+from mint.pandoc_utils import check_latex
+from mint.snippets import SnippetValidator
+
+DONE = object()
+
+
+def _workers(n, target, *args):
+    threads = [
+        threading.Thread(target=target, args=args, daemon=True) for _ in range(n)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def _drain(q, handle):
+    while True:
+        item = q.get()
+        if item is DONE:
+            return
+        try:
+            handle(item)
+        except Exception as e:
+            print(f"Error processing {item}: {e}")
+
+
+def _close(q, threads):
+    for _ in threads:
+        q.put(DONE)
+    for thread in threads:
+        thread.join()
+
+
+def lines(snippets):
+    for snippet in snippets:
+        for line in snippet.splitlines():
+            if line.strip():
+                yield line.strip()
+
+
+def stream_corpus(
+    temp_dir,
+    arxiv_category,
+    num_papers,
+    max_concurrency,
+    max_size,
+    min_caption_length,
+    min_equation_length,
+    max_equation_length,
+    quiet,
+    queue_size=256,
+    compress=False,
+    on_progress=None,
+):
+    # Files are filtered and snippets validated as soon as each paper lands on
+    # disk. The queues are bounded so a slow consumer throttles the downloads.
+    image_queue = queue.Queue(queue_size)
+    tex_queue = queue.Queue(queue_size)
+    snippet_queue = queue.Queue(queue_size)
+    lock = threading.Lock()
+    captions, equations = [], []
+    # Totals grow as the downloads hand over files
+    image_tracker = progress.tracker(on_progress, "filter_images")
+    snippet_tracker = progress.tracker(on_progress, "validate_snippets")
+    # Repeated captions and equations are only compiled once
+    check_caption = SnippetValidator(lambda caption: check_latex(caption, temp_dir))
+    check_equation = SnippetValidator(
+        lambda equation: check_latex(f"$${equation}$$", temp_dir)
+    )
+
+    def route(path):
+        if path.endswith(".tex"):
+            tex_queue.put(path)
+        else:
+            image_tracker.add_total(1)
+            image_queue.put(path)
+
+    def handle_image(path):
+        try:
+            filter_image(temp_dir, path, max_size)
+        finally:
+            image_tracker.update()
+
+    def handle_tex(path):
+        with open_text(path) as tex_file:
+            text = tex_file.read()
+        # Matches can span lines, but the snippet files hold one per line,
+        # so each line is filtered and validated on its own as in the batch
+        # stages
+        for caption in lines(find_captions(text)):
+            if len(caption) >= min_caption_length:
+                snippet_tracker.add_total(1)
+                snippet_queue.put(("caption", caption))
+        for equation in lines(find_equations(text)):
+            if min_equation_length <= len(equation) <= max_equation_length:
+                snippet_tracker.add_total(1)
+                snippet_queue.put(("equation", equation))
+
+    def handle_snippet(item):
+        kind, snippet = item
+        try:
+            if kind == "caption":
+                if check_caption(snippet):
+                    with lock:
+                        captions.append(snippet)
+            elif check_equation(snippet):
+                with lock:
+                    equations.append(snippet)
+        finally:
+            snippet_tracker.update(1, len(snippet))
+
+    image_workers = _workers(
+        max(1, max_concurrency // 4), _drain, image_queue, handle_image
+    )
+    tex_workers = _workers(max(1, max_concurrency // 4), _drain, tex_queue, handle_tex)
+    snippet_workers = _workers(max_concurrency, _drain, snippet_queue, handle_snippet)
+
+    try:
+        # Members are capped at download_papers' own limit, which TeX sources
+        # have to fit too; oversized images are filtered by filter_image
+        download_papers(
+            temp_dir,
+            arxiv_category,
+            num_papers,
+            max_concurrency,
+            on_file=route,
+            compress=compress,
+            on_progress=on_progress,
+        )
+    finally:
+        _close(image_queue, image_workers)
+        image_tracker.close()
+        _close(tex_queue, tex_workers)
+        _close(snippet_queue, snippet_workers)
+        snippet_tracker.close()
+
+    with open_write(os.path.join(temp_dir, "captions.txt"), compress) as f:
+        f.write("\n".join(captions))
+    with open_write(os.path.join(temp_dir, "equations.txt"), compress) as f:
+        f.write("\n".join(equations))
@@ -0,0 +1,53 @@
+import time
+import logging
+import threading
+import requests
+from mint import arxiv_listing
+
+PAGE = b"""<feed xmlns="http://www.w3.org/2005/Atom"
+    xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">
+  <opensearch:totalResults>1</opensearch:totalResults>
+  <entry><id>http://arxiv.org/abs/2401.00001v1</id></entry>
+</feed>"""
+
+
+class Response:
+    content = PAGE
+
+    def raise_for_status(self):
+        pass
+
+
+def test_requests_are_spaced_across_threads(monkeypatch):
+    monkeypatch.setattr(arxiv_listing, "MIN_INTERVAL", 0.05)
+    times = []
+
+    def get(*args, **kwargs):
+        times.append(time.monotonic())
+        return Response()
+
+    monkeypatch.setattr(requests, "get", get)
+    threads = [
+        threading.Thread(target=arxiv_listing.fetch_page, args=("cat:math", 0, 10))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    times.sort()
+    assert len(times) == 4
+    assert all(b - a >= 0.045 for a, b in zip(times, times[1:]))
+
+
+def test_dropped_page_is_logged(monkeypatch, caplog):
+    monkeypatch.setattr(arxiv_listing, "MIN_INTERVAL", 0)
+    monkeypatch.setattr(arxiv_listing, "RETRY_DELAY", 0)
+
+    def fail(*args, **kwargs):
+        raise requests.ConnectionError("refused")
+
+    monkeypatch.setattr(requests, "get", fail)
+    with caplog.at_level(logging.ERROR):
+        assert arxiv_listing.fetch_page("cat:math", 200, 200) == ([], 0)
+    assert "Dropped listing page cat:math from 200" in caplog.text
@@ -0,0 +1,67 @@
+import io
+import os
+import tarfile
+from mint import asset_index
+from mint.asset_index import AssetIndex
+from mint.download_papers import extract_eprint
+
+
+def eprint(members):
+    data = io.BytesIO()
+    with tarfile.open(mode="w", fileobj=data) as tar:
+        for name, content in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    data.seek(0)
+    return data
+
+
+def test_only_kept_images_are_cached(tmp_path):
+    index = AssetIndex(str(tmp_path))
+    data = eprint(
+        [
+            ("paper.tex", b"\\documentclass{article}"),
+            ("fig1.png", b"png one"),
+            ("data.png", os.urandom(64 * 1024)),
+            ("fig2.jpg", b"jpg two"),
+            ("results.csv", os.urandom(64 * 1024)),
+        ]
+    )
+    skipped = extract_eprint(str(tmp_path), data, max_member_size=1024, index=index)
+    assert [member["member"] for member in skipped] == ["data.png"]
+    assets = asset_index.load_index(str(tmp_path))
+    assert [asset["member"] for asset in assets] == ["fig1.png", "fig2.jpg"]
+    archive = os.path.join(tmp_path, assets[0]["archive"])
+    assert os.path.getsize(archive) == len(b"png one") + len(b"jpg two")
+    assert asset_index.read_asset(str(tmp_path), assets[1]) == b"jpg two"
+
+
+def test_pack_size_is_capped(tmp_path):
+    index = AssetIndex(str(tmp_path))
+    data = eprint([(f"fig{i}.png", bytes([i]) * 100) for i in range(5)])
+    with tarfile.open(mode="r", fileobj=data) as tar:
+        new = index.add_images(tar, tar.getmembers(), max_size=250)
+    assert [asset["member"] for asset in new] == ["fig0.png", "fig1.png"]
+    # An e-print with nothing new leaves no file behind
+    data = eprint([("again.png", bytes([0]) * 100)])
+    with tarfile.open(mode="r", fileobj=data) as tar:
+        assert index.add_images(tar, tar.getmembers()) == []
+    assert len(os.listdir(tmp_path / asset_index.ARCHIVE_DIR)) == 1
+
+
+def test_images_carry_their_figure_caption(tmp_path):
+    index = AssetIndex(str(tmp_path))
+    tex = (
+        b"\\begin{figure}\\includegraphics[width=\\linewidth]{figs/loss}"
+        b"\\caption{Training loss over epochs}\\end{figure}"
+    )
+    data = eprint(
+        [("figs/loss.png", b"loss"), ("paper.tex", tex), ("logo.png", b"logo")]
+    )
+    extract_eprint(str(tmp_path), data, index=index)
+    assets = asset_index.load_index(str(tmp_path))
+    assert [asset.get("text") for asset in assets] == [
+        "Training loss over epochs",
+        None,
+    ]
@@ -0,0 +1,17 @@
+import os
+from mint import asset_index, corpus_fs
+
+
+def test_migrate_shards_archives_and_keeps_the_index_valid(tmp_path):
+    archives = tmp_path / asset_index.ARCHIVE_DIR
+    archives.mkdir()
+    (archives / "old.tar").write_bytes(b"headerIMAGE")
+    asset = {"archive": "archives/old.tar", "offset": 6, "size": 5, "sha256": "x"}
+    asset_index.write_index(str(tmp_path), [asset])
+
+    assert corpus_fs.migrate_temp_dir(str(tmp_path)) == {"archives": 1}
+    (asset,) = asset_index.load_index(str(tmp_path))
+    assert asset["archive"] == os.path.relpath(
+        corpus_fs.shard_path(str(archives), "old.tar"), str(tmp_path)
+    )
+    assert asset_index.read_asset(str(tmp_path), asset) == b"IMAGE"
@@ -0,0 +1,40 @@
+import os
+import types
+from mint import latex_template, runner
+
+
+def fake_pdflatex(args, **kwargs):
+    # Leaves the .fmt behind like a successful dump
+    jobname = next(a for a in args if a.startswith("-jobname="))[len("-jobname=") :]
+    out_dir = next(a for a in args if a.startswith("-output-directory="))
+    out_dir = out_dir[len("-output-directory=") :]
+    open(os.path.join(out_dir, f"{jobname}.fmt"), "w").close()
+    return types.SimpleNamespace(returncode=0, timed_out=False)
+
+
+def write_tex(path, title, body):
+    path.write_text(
+        "\\documentclass{article}\n"
+        f"{latex_template.END_OF_DUMP}\n"
+        f"\\title{{{title}}}\n"
+        "\\begin{document}\n"
+        f"{body}\n"
+        "\\end{document}\n"
+    )
+
+
+def test_format_is_keyed_on_the_preamble_before_the_marker(tmp_path, monkeypatch):
+    monkeypatch.setattr(runner, "run", fake_pdflatex)
+    write_tex(tmp_path / "a.tex", "One", "short")
+    write_tex(tmp_path / "b.tex", "Two", "long " * 10000)
+    name = latex_template.dump_format(str(tmp_path), str(tmp_path / "a.tex"))
+    assert name is not None
+    assert latex_template.dump_format(str(tmp_path), str(tmp_path / "b.tex")) == name
+    dumped = (tmp_path / latex_template.FORMATS_DIR / f"{name}.tex").read_text()
+    assert dumped == "\\documentclass{article}\n\\begin{document}\n\\end{document}\n"
+
+
+def test_no_format_without_a_preamble_end(tmp_path, monkeypatch):
+    monkeypatch.setattr(runner, "run", fake_pdflatex)
+    (tmp_path / "a.tex").write_text("\\documentclass{article}\nno body\n")
+    assert latex_template.dump_format(str(tmp_path), str(tmp_path / "a.tex")) is None
@@ -0,0 +1,20 @@
+import codecs
+from mint.pandoc_utils import fallback_encodings
+
+
+def test_fallbacks_are_distinct_codecs(tmp_path):
+    path = tmp_path / "in.md"
+    path.write_bytes("Café au lait, naïve résumé\n".encode("latin-1") * 50)
+    fallbacks = fallback_encodings(str(path), "utf-8")
+    names = [codecs.lookup(name).name for name in fallbacks]
+    assert len(names) == len(set(names))
+    assert "utf-8" not in names
+    assert names[-1] == codecs.lookup("latin1").name
+
+
+def test_the_failed_encoding_is_not_retried_under_an_alias(tmp_path):
+    path = tmp_path / "in.md"
+    path.write_bytes(b"plain \xff text\n" * 50)
+    for alias in ("latin1", "ISO-8859-1", "l1"):
+        fallbacks = fallback_encodings(str(path), alias)
+        assert codecs.lookup("latin1").name not in fallbacks
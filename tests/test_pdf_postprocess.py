@@ -0,0 +1,43 @@
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import DictionaryObject, NameObject, NumberObject, StreamObject
+from mint.pdf_postprocess import optimize_pdf
+
+
+def write_pdf(path):
+    # Two pages, each with its own copy of the same image
+    writer = PdfWriter()
+    for _ in range(2):
+        writer.add_blank_page(100, 100)
+        image = StreamObject()
+        image._data = b"x" * 50000
+        image.update(
+            {
+                NameObject("/Type"): NameObject("/XObject"),
+                NameObject("/Subtype"): NameObject("/Image"),
+                NameObject("/Width"): NumberObject(100),
+                NameObject("/Height"): NumberObject(500),
+                NameObject("/ColorSpace"): NameObject("/DeviceGray"),
+                NameObject("/BitsPerComponent"): NumberObject(8),
+            }
+        )
+        xobjects = DictionaryObject({NameObject("/Im0"): writer._add_object(image)})
+        writer.pages[-1][NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/XObject"): xobjects}
+        )
+    writer.add_outline_item("Introduction", 0)
+    writer.add_outline_item("Results", 1)
+    writer.add_named_destination("results", 1)
+    writer.add_metadata({"/Title": "A Paper", "/Author": "A. Author"})
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def test_optimize_keeps_document_structure(tmp_path):
+    write_pdf(tmp_path / "in.pdf")
+    assert optimize_pdf(str(tmp_path / "in.pdf"), str(tmp_path / "out.pdf")) == 1
+    reader = PdfReader(tmp_path / "out.pdf")
+    assert reader.metadata["/Title"] == "A Paper"
+    assert reader.metadata["/Author"] == "A. Author"
+    assert [reader.get_destination_page_number(o) for o in reader.outline] == [0, 1]
+    assert "results" in reader.named_destinations
+    assert (tmp_path / "out.pdf").stat().st_size < (tmp_path / "in.pdf").stat().st_size
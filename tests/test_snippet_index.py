@@ -0,0 +1,11 @@
+from mint.snippet_index import build_index
+
+
+def test_images_match_on_their_caption_not_their_path():
+    images = [
+        {"sha256": "a", "member": "figures/img1.png", "text": "Training loss curve"},
+        {"sha256": "b", "member": "figures/image2.png"},
+    ]
+    index = build_index([], [], images)["images"]
+    assert index.query("the loss keeps falling") == [0]
+    assert index.query("as the figures show") == []
@@ -0,0 +1,39 @@
+from mint.snippets import canonicalize, snippet_key, validate_snippets
+
+
+def test_spacing_and_aliases_share_a_key():
+    assert snippet_key(r"a \le  b") == snippet_key(r"a \leq b")
+    assert snippet_key(r"\frac {a}{ b }") == snippet_key(r"\frac{a}{b}")
+
+
+def test_comments_are_kept():
+    assert snippet_key("a + b % c") != snippet_key("a + b")
+
+
+def test_escaped_space_before_brace_is_kept():
+    assert canonicalize(r"{a\ }") == r"{a\ }"
+
+
+def test_ties_and_trailing_punctuation_are_kept():
+    assert snippet_key("a~b") != snippet_key("a b")
+    assert snippet_key(r"\left. x \right.") != snippet_key(r"\left. x \right")
+
+
+def test_line_break_then_control_word_is_not_an_alias():
+    assert canonicalize(r"a \\le b") == r"a \\le b"
+
+
+def test_hard_line_break_is_kept():
+    assert canonicalize("a  \nb") == "a  \nb"
+
+
+def test_verdicts_apply_to_every_original():
+    checked = []
+
+    def check(snippet):
+        checked.append(snippet)
+        return "bad" not in snippet
+
+    snippets = ["x  + y", "x + y", "bad", "x + y"]
+    assert validate_snippets(snippets, check, 2) == ["x  + y", "x + y", "x + y"]
+    assert len(checked) == 2
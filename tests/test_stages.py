@@ -0,0 +1,117 @@
+import os
+from mint.stages import Stage, dependencies, run_stages
+
+
+def in_place_pipeline(temp_dir, calls):
+    # Same shape as the corpus pipeline: a download writes images/, then two
+    # filters move files out of images/ in place
+    def download():
+        calls.append("download")
+        os.makedirs(temp_dir / "images", exist_ok=True)
+        for name in ("a.png", "big.png", "photo.png"):
+            (temp_dir / "images" / name).write_text(name)
+
+    def move(name, target):
+        def func():
+            calls.append(f"filter_{target}")
+            os.makedirs(temp_dir / target, exist_ok=True)
+            path = temp_dir / "images" / name
+            if path.exists():
+                os.replace(path, temp_dir / target / name)
+
+        return func
+
+    return [
+        Stage("download", download, outputs=["images"]),
+        Stage(
+            "filter_large",
+            move("big.png", "big_images"),
+            inputs=["images"],
+            outputs=["images", "big_images"],
+        ),
+        Stage(
+            "filter_diagrams",
+            move("photo.png", "non_diagram_images"),
+            inputs=["images"],
+            outputs=["images", "non_diagram_images"],
+        ),
+    ]
+
+
+def test_dependencies():
+    stages = [
+        Stage("template", None, outputs=["template.tex"]),
+        Stage("download", None, outputs=["images", "tex"]),
+        Stage("filter", None, inputs=["images"], outputs=["images", "big"]),
+        Stage("captions", None, inputs=["tex", "template.tex"], outputs=["c.txt"]),
+        Stage("index", None, inputs=["c.txt", "images"], outputs=["index"]),
+    ]
+    assert dependencies(stages) == {
+        "template": set(),
+        "download": set(),
+        "filter": {"download"},
+        "captions": {"template", "download"},
+        "index": {"download", "filter", "captions"},
+    }
+
+
+def test_writer_of_a_read_path_depends_on_the_reader():
+    stages = [
+        Stage("reader", None, inputs=["images"], outputs=["report"]),
+        Stage("writer", None, outputs=["images"]),
+    ]
+    assert dependencies(stages)["writer"] == {"reader"}
+
+
+def test_in_place_stages_are_up_to_date_on_rerun(tmp_path):
+    calls = []
+    statuses = run_stages(tmp_path, in_place_pipeline(tmp_path, calls))
+    assert set(statuses.values()) == {"ran"}
+    for _ in range(2):
+        calls.clear()
+        statuses = run_stages(tmp_path, in_place_pipeline(tmp_path, calls))
+        assert set(statuses.values()) == {"up-to-date"}
+        assert calls == []
+
+
+def test_external_change_reruns_downstream(tmp_path):
+    calls = []
+    run_stages(tmp_path, in_place_pipeline(tmp_path, calls))
+    (tmp_path / "images" / "new.png").write_text("new")
+    calls.clear()
+    statuses = run_stages(tmp_path, in_place_pipeline(tmp_path, calls))
+    assert statuses["download"] == "ran"
+    assert statuses["filter_large"] == "ran"
+    assert statuses["filter_diagrams"] == "ran"
+
+
+def test_forced_stage_keeps_upstream_current(tmp_path):
+    calls = []
+    run_stages(tmp_path, in_place_pipeline(tmp_path, calls))
+    run_stages(
+        tmp_path, in_place_pipeline(tmp_path, calls), force={"filter_diagrams"}
+    )
+    calls.clear()
+    statuses = run_stages(tmp_path, in_place_pipeline(tmp_path, calls))
+    assert set(statuses.values()) == {"up-to-date"}
+
+
+def test_changed_params_rerun_stage(tmp_path):
+    def template_stages(text):
+        def dump():
+            (tmp_path / "template.tex").write_text(text)
+
+        def check():
+            (tmp_path / "checked").write_text((tmp_path / "template.tex").read_text())
+
+        return [
+            Stage("template", dump, outputs=["template.tex"], params={"t": text}),
+            Stage("check", check, inputs=["template.tex"], outputs=["checked"]),
+        ]
+
+    run_stages(tmp_path, template_stages("old"))
+    assert set(run_stages(tmp_path, template_stages("old")).values()) == {
+        "up-to-date"
+    }
+    assert set(run_stages(tmp_path, template_stages("new")).values()) == {"ran"}
+    assert (tmp_path / "checked").read_text() == "new"
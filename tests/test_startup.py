@@ -0,0 +1,38 @@
+import sys
+import subprocess
+import pytest
+from benchmarks.startup import BUDGET_MS, COMMANDS, ROOT, import_times
+
+# Heavy dependencies are imported inside the functions that need them
+LAZY = {"requests", "numpy", "PyPDF2", "PIL", "streamlit", "chardet"}
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    # Modules a bare interpreter imports anyway don't count against the budget
+    return import_times(["-c", "pass"])
+
+
+@pytest.mark.parametrize("label", list(COMMANDS))
+def test_import_time_within_budget(label, baseline):
+    times = import_times(COMMANDS[label])
+    times = {name: us for name, us in times.items() if name not in baseline}
+    slowest = sorted(times.items(), key=lambda t: -t[1])[:5]
+    assert sum(times.values()) / 1000 < BUDGET_MS, slowest
+
+
+@pytest.mark.parametrize("label", list(COMMANDS))
+def test_heavy_dependencies_stay_lazy(label):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *COMMANDS[label]],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=True,
+    )
+    imported = {
+        line.rsplit("|", 1)[1].strip().split(".")[0]
+        for line in result.stderr.decode().splitlines()
+        if line.startswith("import time:") and "|" in line
+    }
+    assert not imported & LAZY